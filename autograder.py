@@ -22,6 +22,8 @@ parser.add_argument('-g', '--graphics', action='store_true',
                     help="Visualize the schedules")
 parser.add_argument('-v', '--verbose', action='store_true',
                     help="Verbose output")
+parser.add_argument('--profile', default=None,
+                    help='Solve profile for the job scheduler (e.g., fast, balanced, first)')
 
 args = parser.parse_args()
 
@@ -55,18 +57,22 @@ class JS_Solution:
         
 # order: a JobScheduler instance
 # max_constraint: which constraints to apply
+# profile: the solve profile to use, if any
 class JS_Test:
-    def __init__(self, order, max_constraint):
+    def __init__(self, order, max_constraint, profile=None):
         self.name = order.name
         self.use_costs = order.use_costs
         self.solution = None
         self.order = order
-        self.order.create_model(max_constraint)
+        options = {}
+        if (profile): options['profile'] = profile
+        self.order.create_model(max_constraint, **options)
 
     def solve(self, verbose=False, visualize=False):
         solution, solver = self.order.solve()
         is_solved = False
         if (verbose):
+            print(" Status: %s" %self.order.status)
             print(" Branches: %d" %solver.NumBranches())
             print(" Wall time: %f" %solver.WallTime())
         if (solution == None):
@@ -165,7 +171,7 @@ def do_scheduling_test(order, js_class, refsol, max_constraint,
     print("Running test %s, constraints: %s"
           %(order.name, list(range(1, max_constraint+1))))
     if verbose: print(" Costs: %s, Parts: %s" %(order.use_costs, order.use_parts))
-    test = JS_Test(order, max_constraint)
+    test = JS_Test(order, max_constraint, args.profile)
     status = test.solve(verbose, visualize)
 
     if (test.solution):
@@ -0,0 +1,129 @@
+import json, os, time
+from concurrent.futures import ProcessPoolExecutor
+import job_scheduler as js
+from parse_orders import parse_orders
+
+# Solve every order in one or more order files, in a pool of processes.
+# The orders are sent to the workers before their models are built (CP-SAT
+#   models cannot be shared between processes), and each worker builds
+#   and solves its own.  Each order gets its own time budget, and the
+#   results are collected into a single report
+
+# The CP-SAT workers each solve may use, so that the processes together
+#   use about one per CPU
+def workers_per_solve(processes):
+    return max(1, (os.cpu_count() or 1) // max(1, processes))
+
+# Build and solve the model of one order.  This runs in a worker process,
+#   so only plain values are returned: a dictionary with the file and name
+#   of the order, its status, objective, bound, value and cost, the
+#   seconds spent building and solving, the solution, and the error, if
+#   any
+def solve_order(filename, order, max_constraint, profile):
+    result = {'file': filename, 'order': order.name,
+              'max_constraint': max_constraint, 'status': None,
+              'objective': None, 'bound': None, 'value': None, 'cost': None,
+              'build_time': 0.0, 'solve_time': 0.0, 'solution': None,
+              'error': None}
+    try:
+        started = time.time()
+        order.create_model(max_constraint, profile)
+        result['build_time'] = time.time() - started
+        started = time.time()
+        solution, solver = order.solve()
+        result['solve_time'] = time.time() - started
+        result['status'] = order.status
+        result['bound'] = order.bound
+        if (solution is not None):
+            result['solution'] = solution
+            result['objective'] = solver.Value(order.objective)
+            result['value'] = solver.Value(order.value)
+            result['cost'] = (solver.Value(order.cost)
+                              if order.cost_constraint is not None else 0)
+    except Exception as e:
+        result['error'] = "%s: %s" %(type(e).__name__, e)
+    return result
+
+# Totals over the results of solve_order: the number of orders, the number
+#   with each status (ERROR for orders that raised an exception), the
+#   total objective of the solved orders, and the total build and solve
+#   times
+def summarize(results, wall_time):
+    statuses = {}
+    for result in results:
+        status = 'ERROR' if result['error'] else result['status']
+        statuses[status] = statuses.get(status, 0) + 1
+    return {'orders': len(results), 'statuses': statuses,
+            'solved': len([result for result in results
+                           if result['solution'] is not None]),
+            'objective': sum([result['objective'] for result in results
+                              if result['objective'] is not None]),
+            'build_time': sum([result['build_time'] for result in results]),
+            'solve_time': sum([result['solve_time'] for result in results]),
+            'wall_time': wall_time}
+
+# Solve all the orders in the files.
+# max_constraint: the constraints to add to every model
+# profile: the solve profile of each order (see js.SOLVE_PROFILES)
+# time_limit: the most seconds to spend solving each order; overrides the
+#   time limit of the profile
+# processes: the size of the pool (None uses one per CPU); with 1, the
+#   orders are solved in this process
+# Returns a report: a dictionary with the results of each order, in the
+#   order the files list them, and their summary
+def solve_batch(filenames, max_constraint=6, profile=None, time_limit=None,
+                processes=None):
+    processes = processes or os.cpu_count() or 1
+    profile = dict(js.get_profile(profile))
+    if (time_limit is not None): profile['time_limit'] = time_limit
+    profile.setdefault('workers', workers_per_solve(processes))
+    tasks = [(filename, order) for filename in filenames
+             for order in parse_orders(filename)]
+    started = time.time()
+    if (processes == 1):
+        results = [solve_order(filename, order, max_constraint, profile)
+                   for filename, order in tasks]
+    else:
+        with ProcessPoolExecutor(processes) as pool:
+            futures = [pool.submit(solve_order, filename, order,
+                                   max_constraint, profile)
+                       for filename, order in tasks]
+            results = [future.result() for future in futures]
+    return {'results': results,
+            'summary': summarize(results, time.time() - started)}
+
+def print_report(report):
+    for result in report['results']:
+        print("%s %s: %s, objective %s (build %.3fs, solve %.3fs)%s"
+              %(result['file'], result['order'], result['status'],
+                result['objective'], result['build_time'],
+                result['solve_time'],
+                " " + result['error'] if result['error'] else ""))
+    summary = report['summary']
+    print("%d orders, %d solved, total objective %d, %.3fs"
+          %(summary['orders'], summary['solved'], summary['objective'],
+            summary['wall_time']))
+    print("  %s" %", ".join(["%s: %d" %item
+                             for item in sorted(summary['statuses'].items())]))
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Solve every order in the order files')
+    parser.add_argument('files', nargs='+', help='Order files')
+    parser.add_argument('-c', '--max-constraint', default=6, type=int,
+                        help='Which constraints to apply (defaults to 6)')
+    parser.add_argument('-j', '--processes', default=None, type=int,
+                        help='Number of processes (defaults to one per CPU)')
+    parser.add_argument('-t', '--time-limit', default=None, type=float,
+                        help='Most seconds to spend solving each order')
+    parser.add_argument('--profile', default=None,
+                        help='Solve profile (e.g., fast, balanced, first)')
+    parser.add_argument('--json', default=None,
+                        help='Also write the report to this file, as JSON')
+    args = parser.parse_args()
+    report = solve_batch(args.files, args.max_constraint, args.profile,
+                         args.time_limit, args.processes)
+    print_report(report)
+    if (args.json):
+        with open(args.json, 'w') as f: json.dump(report, f, indent=1)
@@ -0,0 +1,134 @@
+import json, sys, time
+import job_scheduler as js
+from parse_orders import parse_orders
+import order_generator as og
+
+# Benchmarks of the job scheduler.
+# Every order in the grader files is built and solved at every constraint
+#   level, the orders of the last file are also scaled up (see
+#   scale_order), and random orders of growing size are generated (see
+#   order_generator.py).  Each run is recorded as one JSON object per line, with
+#   the time spent parsing the file, building each pass of the model
+#   (JobScheduler.stats) and solving, the size of the model, and the
+#   search statistics, objective and bound of the solve, so that runs with
+#   different solver settings or code can be compared.  Every solve has a
+#   time limit, which is recorded with it, so that the larger orders cannot
+#   hold up the suite
+
+grader_files = ["grader_files/orders_s%d.txt" %step for step in range(1, 9)]
+max_constraints = list(range(1, 9))
+# The most seconds to spend solving each order, unless the profile or the
+#   caller sets another limit
+default_time_limit = 30
+
+# Return a copy of the order with each job repeated factor times (as
+#   J1, J1.2, ..., J1.<factor>) and the deadline multiplied by factor.
+#   The copies share the tasks, machines, tools and parts of the order
+def scale_order(order, factor):
+    jobs = []
+    for job in order.jobs:
+        jobs.append(job)
+        jobs += [js.Job("%s.%d" %(job.name, copy_id), job.tasks)
+                 for copy_id in range(2, factor+1)]
+    return js.JobScheduler("%sx%d" %(order.name, factor),
+                           order.deadline * factor, jobs, order.tasks,
+                           order.machines, order.parts, order.tools,
+                           order.use_costs, order.use_parts)
+
+# Build and solve the order, and return the record of the run
+# info: more fields for the record, e.g., the suite and file
+def run_order(order, max_constraint, profile=None, info={}):
+    record = dict(info)
+    record.update({'order': order.name, 'max_constraint': max_constraint,
+                   'jobs': len(order.jobs), 'machines': len(order.machines),
+                   'deadline': order.deadline,
+                   'time_limit': js.get_profile(profile).get('time_limit')})
+    started = time.time()
+    order.create_model(max_constraint, profile)
+    record['build_time'] = time.time() - started
+    record['build_times'] = order.stats.build_times()
+    proto = order.model.Proto()
+    record['variables'] = len(proto.variables)
+    record['constraints'] = len(proto.constraints)
+    solution, solver = order.solve()
+    record.update({'status': order.status,
+                   'solve_time': solver.WallTime(),
+                   'branches': solver.NumBranches(),
+                   'conflicts': solver.NumConflicts(),
+                   'objective': (int(solver.ObjectiveValue())
+                                 if solution is not None else None),
+                   'bound': solver.BestObjectiveBound(),
+                   'scheduled_jobs': len(solution or {})})
+    return record
+
+# Parse the file and return its orders and the seconds parsing took
+def timed_parse(filename):
+    started = time.time()
+    orders = parse_orders(filename)
+    return orders, time.time() - started
+
+# Generate the records of the runs, one at a time.
+# files: the order files, each solved at each level in levels
+# scales: the factors by which each order of the last file is scaled up
+# synthetic: the numbers of jobs of the random orders, which are solved
+#   with every constraint
+# profile: the solve profile (see js.SOLVE_PROFILES)
+# time_limit: the most seconds to spend solving each order; overrides the
+#   time limit of the profile, which defaults to default_time_limit
+def run_benchmarks(files=grader_files, levels=max_constraints, scales=[2, 4],
+                   synthetic=[25, 50, 100], profile=None, time_limit=None):
+    profile = dict(js.get_profile(profile))
+    if (time_limit is not None): profile['time_limit'] = time_limit
+    profile.setdefault('time_limit', default_time_limit)
+    for filename in files:
+        for max_constraint in levels:
+            orders, parse_time = timed_parse(filename)
+            for order in orders:
+                yield run_order(order, max_constraint, profile,
+                                {'suite': 'grader', 'file': filename,
+                                 'parse_time': parse_time})
+    if (files and scales):
+        filename = files[-1]
+        for factor in scales:
+            orders, parse_time = timed_parse(filename)
+            for order in orders:
+                yield run_order(scale_order(order, factor), max(levels),
+                                profile,
+                                {'suite': 'scaled', 'file': filename,
+                                 'scale': factor, 'parse_time': parse_time})
+    for jobs in synthetic:
+        order = og.build_order(og.generate_order('gen%d' %jobs, jobs=jobs,
+                                                 machines=max(4, jobs // 4)))
+        yield run_order(order, max_constraints[-1], profile,
+                        {'suite': 'synthetic'})
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Benchmark the job scheduler; writes one JSON record per run')
+    parser.add_argument('-f', '--files', nargs='+', default=grader_files,
+                        help='Order files (defaults to the grader files)')
+    parser.add_argument('-c', '--levels', nargs='+', type=int,
+                        default=max_constraints,
+                        help='Constraint levels (defaults to 1-8)')
+    parser.add_argument('--scales', nargs='*', type=int, default=[2, 4],
+                        help='Factors by which to scale the orders of the last file')
+    parser.add_argument('--synthetic', nargs='*', type=int, default=[25, 50, 100],
+                        help='Numbers of jobs of the random orders')
+    parser.add_argument('--profile', default=None,
+                        help='Solve profile (e.g., fast, balanced, first)')
+    parser.add_argument('-t', '--time-limit', default=None, type=float,
+                        help='Most seconds to spend solving each order (defaults to the limit of the profile, or %d)'
+                        %default_time_limit)
+    parser.add_argument('-o', '--output', default=None,
+                        help='File for the records (defaults to stdout)')
+    args = parser.parse_args()
+    out = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        for record in run_benchmarks(args.files, args.levels, args.scales,
+                                     args.synthetic, args.profile,
+                                     args.time_limit):
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+    finally:
+        if (args.output): out.close()
@@ -0,0 +1,170 @@
+import json, sys
+from parse_orders import parse_orders
+
+# Check the incremental order editing of JobScheduler against fresh models.
+# Each check edits a built model in place (add_job, remove_job,
+#   change_deadline, disable_machine, enable_machine) and solves it, then
+#   builds and solves a new model of the edited order from scratch.  Both
+#   must reach the same objective.  The checks are run with each model
+#   option changed from its default, since the options add variables and
+#   constraints that the edits have to keep up to date.  Objectives are
+#   only compared when both solves prove them optimal within the time
+#   limit
+
+grader_files = ["grader_files/orders_s%d.txt" %step for step in range(1, 9)]
+levels = [4, 8]
+
+# Model options to check, each as a name and the options to set
+option_sets = [('default', {}),
+               ('linear_ordering', {'linear_ordering': True}),
+               ('no_job_symmetry', {'break_job_symmetry': False}),
+               ('no_machine_symmetry', {'break_machine_symmetry': False}),
+               ('cumulative_tools', {'cumulative_tools': True})]
+
+# How much the deadline checks move the deadline
+deadline_change = 4
+# The most seconds to spend on each solve
+time_limit = 10
+
+def load_order(filename, index, options):
+    order = parse_orders(filename)[index]
+    for name, value in options.items(): setattr(order, name, value)
+    return order
+
+def objective(order, profile):
+    solution, solver = order.solve(profile)
+    return (order.status,
+            solver.Value(order.objective) if solution is not None else None)
+
+# The edits, each a function of (order, max_constraint) that builds the
+#   model of the order and edits it.  It returns a function that makes
+#   the same change to a fresh copy of the order, before its model is
+#   built, or None if the edit does not apply to the order
+def edit_remove_job(order, max_constraint):
+    if (len(order.jobs) < 2): return None
+    job = order.jobs[1]
+    order.create_model(max_constraint)
+    order.remove_job(job.name)
+    return lambda fresh: fresh.jobs.pop(1)
+
+def edit_readd_job(order, max_constraint):
+    if (len(order.jobs) < 2): return None
+    job = order.jobs[1]
+    order.create_model(max_constraint)
+    order.remove_job(job.name)
+    order.add_job(job)
+    return lambda fresh: None
+
+def edit_add_job(order, max_constraint):
+    if (len(order.jobs) < 2): return None
+    job = order.jobs.pop()
+    order.create_model(max_constraint)
+    order.add_job(job)
+    return lambda fresh: None
+
+# A model built for an earlier deadline lacks the task/machine
+#   combinations that only fit by the later one, which change_deadline
+#   must add
+def edit_later_deadline(order, max_constraint):
+    deadline = order.deadline
+    order.deadline -= deadline_change
+    order.create_model(max_constraint)
+    order.change_deadline(deadline)
+    return lambda fresh: None
+
+def edit_earlier_deadline(order, max_constraint):
+    deadline = order.deadline - deadline_change
+    order.create_model(max_constraint)
+    order.change_deadline(deadline)
+    def edit(fresh): fresh.deadline = deadline
+    return edit
+
+def edit_disable_machine(order, max_constraint):
+    name = order.machines[0].name
+    order.create_model(max_constraint)
+    order.disable_machine(name)
+    return lambda fresh: fresh.disabled_machines.add(name)
+
+def edit_enable_machine(order, max_constraint):
+    name = order.machines[0].name
+    order.create_model(max_constraint)
+    order.disable_machine(name)
+    order.enable_machine(name)
+    return lambda fresh: None
+
+edits = [('remove_job', edit_remove_job), ('readd_job', edit_readd_job),
+         ('add_job', edit_add_job), ('later_deadline', edit_later_deadline),
+         ('earlier_deadline', edit_earlier_deadline),
+         ('disable_machine', edit_disable_machine),
+         ('enable_machine', edit_enable_machine)]
+
+# Run one edit on the order at the given index of the file, and return the
+#   record of the check: the (status, objective) of the edited and fresh
+#   models, whether they match (None if the check does not apply or
+#   either objective is not proven optimal), and the error of the edit,
+#   if any
+def check_edit(filename, index, options, max_constraint, edit, profile):
+    order = load_order(filename, index, options)
+    record = {'order': order.name, 'edited': None, 'fresh': None,
+              'match': None, 'error': None}
+    try:
+        change = edit(order, max_constraint)
+    except Exception as e:
+        record['error'] = "%s: %s" %(type(e).__name__, e)
+        return record
+    if (change is None): return record
+    record['edited'] = objective(order, profile)
+    fresh = load_order(filename, index, options)
+    change(fresh)
+    fresh.create_model(max_constraint)
+    record['fresh'] = objective(fresh, profile)
+    if (record['edited'][0] == 'OPTIMAL' and record['fresh'][0] == 'OPTIMAL'):
+        record['match'] = (record['edited'] == record['fresh'])
+    return record
+
+# Generate the records of the checks, one at a time
+def run_checks(files=grader_files, levels=levels, options=option_sets,
+               time_limit=time_limit):
+    profile = {'time_limit': time_limit}
+    for filename in files:
+        count = len(parse_orders(filename))
+        for max_constraint in levels:
+            for index in range(count):
+                for option_name, option_values in options:
+                    for edit_name, edit in edits:
+                        record = check_edit(filename, index, option_values,
+                                            max_constraint, edit, profile)
+                        record.update({'file': filename,
+                                       'max_constraint': max_constraint,
+                                       'options': option_name,
+                                       'edit': edit_name})
+                        yield record
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Check edited models against freshly built ones')
+    parser.add_argument('-f', '--files', nargs='+', default=grader_files,
+                        help='Order files (defaults to the grader files)')
+    parser.add_argument('-c', '--levels', nargs='+', type=int, default=levels,
+                        help='Constraint levels (defaults to 4 and 8)')
+    parser.add_argument('-t', '--time-limit', default=time_limit, type=float,
+                        help='Most seconds to spend on each solve (defaults to %d)'
+                        %time_limit)
+    parser.add_argument('-a', '--all', action='store_true',
+                        help='Print every check, not only the failures')
+    args = parser.parse_args()
+    checks = failures = unproven = 0
+    for record in run_checks(args.files, args.levels, option_sets,
+                             args.time_limit):
+        if (record['match'] is None and record['error'] is None):
+            # Not applicable, or not solved to optimality in time
+            unproven += record['edited'] is not None
+            continue
+        checks += 1
+        failed = not record['match']
+        failures += failed
+        if (failed or args.all): print(json.dumps(record))
+    print("%d checks, %d failed, %d not proven optimal in time"
+          %(checks, failures, unproven))
+    sys.exit(1 if failures else 0)
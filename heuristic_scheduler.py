@@ -0,0 +1,268 @@
+import numpy as np
+import job_scheduler as js
+
+# A fast, greedy alternative to solving the CP-SAT model of a JobScheduler.
+# Jobs are taken one at a time in order of a priority rule, and each job is
+#   either scheduled completely, task after task, or not at all.  Each task
+#   is put on the machine that gives it the most (net) value, as early as
+#   its machine, tools and parts allow, and no earlier than the release of
+#   the order.  Work already committed (fixed_intervals and fixed_events)
+#   is taken as it is in the model.  The result is in the format returned
+#   by JobScheduler.solve, so it can be used on its own or as a hint for
+#   the CP-SAT search (see JobScheduler.apply_hint)
+
+# The energy and part costs of doing a task on a machine
+def task_machine_cost(order, task, tm):
+    return order.arrays().cost(task, tm)
+
+# The value of doing a task on a machine, less its cost if costs are used
+def net_value(order, task, tm, use_costs):
+    return tm.value - (task_machine_cost(order, task, tm) if use_costs else 0)
+
+def best_net_value(order, job, use_costs):
+    return sum([max([net_value(order, task, tm, use_costs)
+                     for tm in task.task_machines] or [0])
+                for task in job.tasks])
+
+def min_duration(job):
+    return sum([min([tm.duration for tm in task.task_machines] or [0])
+                for task in job.tasks])
+
+# Priority rules: each maps a job to a key; jobs with larger keys are
+#   scheduled first
+priority_rules = {
+    'value_density': lambda order, job, use_costs:
+        best_net_value(order, job, use_costs) / max(1, min_duration(job)),
+    'value': lambda order, job, use_costs:
+        best_net_value(order, job, use_costs),
+    'spt': lambda order, job, use_costs: -min_duration(job),
+    'order': lambda order, job, use_costs: -order.jobs.index(job)}
+
+class HeuristicScheduler:
+    # order: a JobScheduler
+    # use_costs: whether costs count against the value (defaults to
+    #   order.use_costs)
+    def __init__(self, order, use_costs=None):
+        self.order = order
+        self.use_costs = order.use_costs if use_costs is None else use_costs
+        deadline = order.deadline
+        # Machine occupancy, tool use and part level per time unit.
+        # A task from start to end occupies its machine and tools during
+        #   [start, end).  As in the reservoir constraints, the level of a
+        #   part goes up by each part taken at the start of a task, and
+        #   down by each part made at the end of a PartsTask; it must stay
+        #   between 0 and the quantity of the part
+        self.busy = dict([(machine.name, bytearray(deadline+1))
+                          for machine in order.machines])
+        self.tool_use = dict([(tool.name, [0]*(deadline+1))
+                              for tool in order.tools])
+        self.part_level = dict([(part.name, np.zeros(deadline+1, np.int64))
+                                for part in order.parts])
+        # The lowest and highest part levels from each time on, kept until
+        #   the levels of the part change
+        self.part_bounds = {}
+        self.tools = dict([(tool.name, tool) for tool in order.tools])
+        self.parts = dict([(part.name, part) for part in order.parts])
+        self.solution = {}
+        for mname, intervals in order.fixed_intervals.items():
+            if (not mname in self.busy): continue
+            for start, end in intervals:
+                for t in range(max(0, start), min(end, deadline+1)):
+                    self.busy[mname][t] = 1
+        if (order.use_parts):
+            for name, events in order.fixed_events.items():
+                for time, change in events:
+                    time = max(0, time)
+                    if (name in self.tool_use):
+                        use = self.tool_use[name]
+                        for t in range(time, deadline+1): use[t] += change
+                    if (name in self.part_level):
+                        self._change_parts([(name, time, change)], 1)
+
+    def _counts(self, items):
+        counts = {}
+        for item in items: counts[item.name] = counts.get(item.name, 0) + 1
+        return counts
+
+    def _fits_machine(self, machine, start, end):
+        return not any(self.busy[machine.name][start:end])
+
+    def _fits_tools(self, task, start, end):
+        if (not self.order.use_parts): return True
+        for tname, count in self._counts(task.tools).items():
+            use = self.tool_use[tname]
+            if (max(use[start:end]) + count > self.tools[tname].num):
+                return False
+        return True
+
+    # The level changes a task makes to each part: (name, time, change)
+    def _part_changes(self, task, start, end):
+        changes = []
+        if (not self.order.use_parts): return changes
+        for pname, count in self._counts(task.parts).items():
+            changes.append((pname, start, count))
+        if (isinstance(task, js.PartsTask) and
+            task.produced_part.name in self.parts):
+            changes.append((task.produced_part.name, end, -task.quantity))
+        return changes
+
+    def _change_parts(self, changes, sign):
+        for pname, time, change in changes:
+            self.part_level[pname][time:] += sign * change
+            self.part_bounds.pop(pname, None)
+
+    def _part_bounds(self, pname):
+        bounds = self.part_bounds.get(pname)
+        if (bounds is None):
+            reverse = self.part_level[pname][::-1]
+            bounds = self.part_bounds[pname] = (
+                np.minimum.accumulate(reverse)[::-1],
+                np.maximum.accumulate(reverse)[::-1])
+        return bounds
+
+    # The earliest start in [first, last] from which a single level change
+    #   of the part, made offset after the start, keeps its level in
+    #   bounds; None if there is none.  Adding a change at a later time
+    #   affects fewer of the levels, so once it fits it fits at every later
+    #   start
+    def _first_part_start(self, pname, offset, change, first, last):
+        low, high = self._part_bounds(pname)
+        fits = ((low[first+offset:last+offset+1] + change >= 0) &
+                (high[first+offset:last+offset+1] + change <=
+                 self.parts[pname].quantity))
+        if (not fits.any()): return None
+        return first + int(fits.argmax())
+
+    # Whether the level changes of a task, all to the same part and sorted
+    #   by time, keep its level in bounds
+    def _fits_part(self, pname, changes):
+        level = self.part_level[pname]
+        low, high = self._part_bounds(pname)
+        quantity = self.parts[pname].quantity
+        total = 0
+        for (time, change), (next_time, next_change) in zip(
+                changes, changes[1:] + [(None, 0)]):
+            total += change
+            if (next_time is None):
+                return (low[time] + total >= 0 and
+                        high[time] + total <= quantity)
+            if (next_time > time):
+                between = level[time:next_time]
+                if (between.min() + total < 0 or
+                    between.max() + total > quantity):
+                    return False
+
+    # Find the earliest start, no earlier than earliest, at which the task
+    #   fits on the machine of tm; None if it does not fit by the deadline.
+    # A part that the task changes once limits the start from below (see
+    #   _first_part_start), so it is not checked at each start; a part it
+    #   both uses and makes is
+    def _earliest_start(self, task, tm, earliest):
+        if (tm.machine.name in self.order.disabled_machines or
+            not tm.machine.name in self.busy):
+            return None
+        last = self.order.deadline - tm.duration
+        if (earliest > last): return None
+        by_part = {}
+        for pname, offset, change in self._part_changes(task, 0, tm.duration):
+            by_part.setdefault(pname, []).append((offset, change))
+        checked = []
+        for pname, changes in by_part.items():
+            if (len(changes) > 1):
+                checked.append((pname, sorted(changes)))
+                continue
+            offset, change = changes[0]
+            earliest = self._first_part_start(pname, offset, change,
+                                              earliest, last)
+            if (earliest is None): return None
+        for start in range(earliest, last + 1):
+            end = start + tm.duration
+            if (self._fits_machine(tm.machine, start, end) and
+                self._fits_tools(task, start, end) and
+                all([self._fits_part(pname, [(start + offset, change)
+                                             for offset, change in changes])
+                     for pname, changes in checked])):
+                return start
+        return None
+
+    def _reserve(self, task, tm, start, sign):
+        end = start + tm.duration
+        busy = self.busy[tm.machine.name]
+        for t in range(start, end): busy[t] = 1 if sign > 0 else 0
+        if (self.order.use_parts):
+            for tname, count in self._counts(task.tools).items():
+                use = self.tool_use[tname]
+                for t in range(start, end): use[t] += sign * count
+        self._change_parts(self._part_changes(task, start, end), sign)
+
+    # Schedule every task of the job, each starting after the one before
+    #   it ends.  If some task does not fit, undo the job and return False
+    def schedule_job(self, job):
+        placed = []
+        earliest = max(1, self.order.release)
+        for task in job.tasks:
+            choices = []
+            for tm in task.task_machines:
+                start = self._earliest_start(task, tm, earliest)
+                if (start is not None):
+                    choices.append((-net_value(self.order, task, tm,
+                                               self.use_costs),
+                                    start + tm.duration, start, tm))
+            if (not choices):
+                for task, tm, start in placed: self._reserve(task, tm, start, -1)
+                return False
+            value, end, start, tm = min(choices, key=lambda c: c[:3])
+            self._reserve(task, tm, start, 1)
+            placed.append((task, tm, start))
+            earliest = end
+        if (placed):
+            self.solution[job.name] = [(tm.machine.name, start, tm.duration)
+                                       for task, tm, start in placed]
+        return True
+
+    # Schedule the jobs in order of the priority rule.  Jobs whose best
+    #   possible net value is negative are left out
+    def schedule(self, rule='value_density'):
+        order = self.order
+        key = priority_rules[rule]
+        jobs = sorted(order.jobs, key=lambda job: -key(order, job,
+                                                       self.use_costs))
+        for job in jobs:
+            if (best_net_value(order, job, self.use_costs) >= 0):
+                self.schedule_job(job)
+        return self.solution
+
+# Return a schedule for the order in the format of JobScheduler.solve
+def heuristic_schedule(order, rule='value_density', use_costs=None):
+    return HeuristicScheduler(order, use_costs).schedule(rule)
+
+# Return the objective, value and cost of a schedule for the order, as
+#   the CP-SAT model would compute them
+def evaluate(order, solution, use_costs=None):
+    use_costs = order.use_costs if use_costs is None else use_costs
+    value = cost = 0
+    for job in order.jobs:
+        for task, mname, start, duration in \
+                order.match_solution_tasks(job, solution.get(job.name, [])):
+            tm = [tm for tm in task.task_machines if tm.machine.name == mname][0]
+            value += tm.value
+            cost += task_machine_cost(order, task, tm)
+    return (value - cost if use_costs else value), value, cost
+
+# Try every priority rule and return the schedule with the best objective
+def best_heuristic_schedule(order, use_costs=None):
+    best = None
+    for rule in priority_rules:
+        solution = heuristic_schedule(order, rule, use_costs)
+        objective = evaluate(order, solution, use_costs)[0]
+        if (best is None or objective > best[0]): best = (objective, solution)
+    return best[1]
+
+if __name__ == '__main__':
+    import sys
+    from parse_orders import parse_orders
+    for order in parse_orders(sys.argv[1] if len(sys.argv) > 1 else
+                              "grader_files/orders.txt"):
+        solution = best_heuristic_schedule(order)
+        print("%s: objective %d" %(order.name, evaluate(order, solution)[0]))
+        print("  %s" %solution)
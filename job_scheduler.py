@@ -1,6 +1,152 @@
+import asyncio, json, queue, threading, time, weakref
+from collections.abc import Mapping
+import numpy as np
 from ortools.sat.python import cp_model
 
+# Named solver profiles that trade optimality for predictable latency.
+#  time_limit: wall-clock limit in seconds
+#  workers: number of parallel search workers
+#  relative_gap/absolute_gap: stop once the objective is within the gap
+#    of the best bound
+#  first_solution: stop as soon as a feasible schedule is found
+# A profile may be given by name or as a dictionary of these keys
+SOLVE_PROFILES = {'default': {},
+                  'first': {'first_solution': True, 'workers': 1},
+                  'fast': {'time_limit': 1.0, 'workers': 8,
+                           'relative_gap': 0.05},
+                  'balanced': {'time_limit': 10.0, 'workers': 8,
+                               'relative_gap': 0.01},
+                  'optimal': {'workers': 8}}
+
+def get_profile(profile):
+    if (profile is None): return {}
+    if (isinstance(profile, dict)): return profile
+    if (not profile in SOLVE_PROFILES):
+        raise Exception("Unknown solve profile: %s" %profile)
+    return SOLVE_PROFILES[profile]
+
+# Copy the settings of the given profile onto the CP-SAT solver parameters
+def configure_solver(solver, profile):
+    params = get_profile(profile)
+    for pname in params:
+        if (not pname in ('time_limit', 'workers', 'relative_gap',
+                          'absolute_gap', 'first_solution')):
+            raise Exception("Unknown solve profile parameter: %s" %pname)
+    if (params.get('time_limit') is not None):
+        solver.parameters.max_time_in_seconds = params['time_limit']
+    if (params.get('workers') is not None):
+        solver.parameters.num_workers = params['workers']
+    if (params.get('relative_gap') is not None):
+        solver.parameters.relative_gap_limit = params['relative_gap']
+    if (params.get('absolute_gap') is not None):
+        solver.parameters.absolute_gap_limit = params['absolute_gap']
+    if (params.get('first_solution')):
+        solver.parameters.stop_after_first_solution = True
+    return solver
+
+# Return the object in the list with the given name, or None
+def get_named(name, objects):
+    for object in objects:
+        if (name == object.name): return object
+    return None
+
+# The most solves that solve_async runs at once in an event loop, across
+#   all schedulers
+MAX_CONCURRENT_SOLVES = 4
+# An asyncio.Semaphore can only be used in one event loop, so each running
+#   loop gets its own; they go away with their loops
+_solve_slots = weakref.WeakKeyDictionary()
+_solve_slots_lock = threading.Lock()
+
+def solve_slots():
+    loop = asyncio.get_running_loop()
+    with _solve_slots_lock:
+        slots = _solve_slots.get(loop)
+        if (slots is None):
+            slots = _solve_slots[loop] = asyncio.Semaphore(MAX_CONCURRENT_SOLVES)
+    return slots
+
+# Change the number of concurrent solves; call this before any
+#   solve_async is running
+def set_max_concurrent_solves(num):
+    global MAX_CONCURRENT_SOLVES
+    MAX_CONCURRENT_SOLVES = num
+    with _solve_slots_lock: _solve_slots.clear()
+
+# Wait for work running in an executor.  If the waiting task is cancelled,
+#   call on_cancel (e.g., to stop the search) and still wait for the work
+#   to finish before passing on the cancellation, so that it no longer
+#   uses its solve slot
+async def _run_to_completion(future, on_cancel=None):
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        if (on_cancel): on_cancel()
+        try: await future
+        except Exception: pass
+        raise
+
+# Instrumentation of a JobScheduler: how long each pass of create_model
+#   took and how many variables and constraints it added, and the search
+#   statistics of each solve.  create_model starts a new SchedulerStats in
+#   JobScheduler.stats.
+# log: a file name or file object; if given, each pass and each solve is
+#   also written to it as a line of JSON
+class SchedulerStats:
+    def __init__(self, order_name, max_constraint, log=None):
+        self.order = order_name
+        self.max_constraint = max_constraint
+        self.log = log
+        # One dictionary per pass (pass, time, variables, constraints) and
+        #   per solve (status, wall_time, branches, conflicts, objective,
+        #   bound)
+        self.passes = []
+        self.solves = []
+
+    def add_pass(self, name, seconds, variables, constraints):
+        record = {'pass': name, 'time': seconds, 'variables': variables,
+                  'constraints': constraints}
+        self.passes.append(record)
+        self._write('pass', record)
+
+    def add_solve(self, solver, status, solved):
+        record = {'status': solver.StatusName(status),
+                  'wall_time': solver.WallTime(),
+                  'branches': solver.NumBranches(),
+                  'conflicts': solver.NumConflicts(),
+                  'objective': (int(solver.ObjectiveValue())
+                                if solved else None),
+                  'bound': solver.BestObjectiveBound()}
+        self.solves.append(record)
+        self._write('solve', record)
+
+    def _write(self, event, record):
+        if (self.log is None): return
+        line = json.dumps(dict(record, event=event, order=self.order,
+                               max_constraint=self.max_constraint)) + "\n"
+        if (hasattr(self.log, 'write')): self.log.write(line)
+        else:
+            with open(self.log, 'a') as f: f.write(line)
+
+    # The seconds spent in each pass
+    def build_times(self):
+        return dict([(record['pass'], record['time'])
+                     for record in self.passes])
+
+    def build_time(self):
+        return sum([record['time'] for record in self.passes])
+
+    def as_dict(self):
+        return {'order': self.order, 'max_constraint': self.max_constraint,
+                'build_time': self.build_time(), 'passes': self.passes,
+                'solves': self.solves}
+
+# The objects of an order use __slots__, since large orders have very
+#   many of them.  Each subclass has a name slot, except TaskMachine,
+#   whose name is computed
 class SchedObj(object):
+    __slots__ = ()
+
     def __init__(self, name):
         self.name = name
 
@@ -8,11 +154,16 @@ class SchedObj(object):
     def __repr__(self): return self.__str__()
     
 class Machine(SchedObj):
+    # id is set by the autograder to plot schedules
+    __slots__ = ('name', 'energy_cost', 'id')
+
     def __init__(self, name, energy_cost):
         super(Machine, self).__init__(name)
         self.energy_cost = energy_cost
 
 class Tool(SchedObj):
+    __slots__ = ('name', 'num')
+
     def __init__(self, name, num):
         super(Tool, self).__init__(name)
         self.num = num
@@ -20,6 +171,8 @@ class Tool(SchedObj):
     def __str__(self): return "[Tool: %s: %d]" %(self.name, self.num)
 
 class Part(SchedObj):
+    __slots__ = ('name', 'quantity', 'cost')
+
     def __init__(self, name, quantity, cost):
         super(Part, self).__init__(name)
         self.quantity = quantity
@@ -31,6 +184,8 @@ class Part(SchedObj):
 # parts are consumable/renewable resources; tools are sharable resources
 # The parts and tools need to be available throughout the task duration
 class Task(SchedObj):
+    __slots__ = ('name', 'tools', 'parts', 'task_machines')
+
     def __init__(self, name, tools, parts):
         super(Task, self).__init__(name)
         self.tools = tools
@@ -43,25 +198,155 @@ class Task(SchedObj):
 
 # It's a special type of Task that creates new parts
 class PartsTask(Task):
+    __slots__ = ('produced_part', 'quantity')
+
     def __init__(self, name, part, quantity, tools=[], parts=[]):
         super(PartsTask, self).__init__(name, tools, parts)
         self.produced_part = part
         self.quantity = quantity
 
 # The parameters for a machine completing a given task
+# There is one of these for every alternative of every task, so the name
+#   is only formatted when it is asked for
 class TaskMachine(SchedObj):
+    __slots__ = ('task', 'machine', 'duration', 'value')
+
     def __init__(self, task, machine, duration, value):
-        super(TaskMachine, self).__init__("%s-%s" %(task.name, machine.name))
         self.task = task
         self.machine = machine
         self.duration = duration
         self.value = value
 
+    @property
+    def name(self): return "%s-%s" %(self.task.name, self.machine.name)
+
 class Job(SchedObj):
+    __slots__ = ('name', 'tasks')
+
     def __init__(self, name, tasks):
         super(Job, self).__init__(name)
         self.tasks = tasks
 
+# A columnar index of an order, built from its objects (see
+#   JobScheduler.arrays).  Tasks, machines, tools and parts are numbered in
+#   the order they are first found, and each task/machine alternative is
+#   numbered within the alternatives of its task:
+#  task_index, machine_index, tool_index, part_index: name -> number
+#  machine_energy, tool_num, part_quantity, part_cost: one entry per
+#    machine, tool or part; tools and parts that are used but not listed
+#    in the order have a cost of 0, as in the cost constraint
+#  tool_demand, part_demand: tasks x tools and tasks x parts matrices of
+#    how many of each a task needs
+#  produced_part, produced_quantity: the part each task makes (-1 if it
+#    is not a PartsTask) and how many
+#  task_offsets: the alternatives of task t are task_offsets[t] up to
+#    task_offsets[t+1]
+#  tm_task, tm_machine, tm_duration, tm_value: one entry per alternative
+#  tm_cost: the energy and part cost of each alternative
+#  tm_index: (task name, machine name) -> alternative number
+class OrderArrays:
+    def __init__(self, order):
+        tasks = []
+        self.task_index = {}
+        for task in order.tasks + [task for job in order.jobs +
+                                   getattr(order, 'removed_jobs', [])
+                                   for task in job.tasks]:
+            if (not task.name in self.task_index):
+                self.task_index[task.name] = len(tasks)
+                tasks.append(task)
+        self.tasks = tasks
+        machines = self._number(order.machines +
+                                [tm.machine for task in tasks
+                                 for tm in task.task_machines])
+        self.machine_index, self.machines = machines
+        self.tool_index, self.tools = self._number(
+            order.tools + [tool for task in tasks for tool in task.tools])
+        self.part_index, self.parts = self._number(
+            order.parts + [part for task in tasks for part in task.parts] +
+            [task.produced_part for task in tasks
+             if isinstance(task, PartsTask)])
+        listed_parts = set([part.name for part in order.parts])
+
+        self.machine_energy = np.array([machine.energy_cost for machine
+                                        in self.machines], dtype=np.int64)
+        self.tool_num = np.array([tool.num for tool in self.tools],
+                                 dtype=np.int64)
+        self.part_quantity = np.array([part.quantity for part in self.parts],
+                                      dtype=np.int64)
+        self.part_cost = np.array([part.cost if part.name in listed_parts
+                                   else 0 for part in self.parts],
+                                  dtype=np.int64)
+        self.tool_demand = np.zeros((len(tasks), len(self.tools)),
+                                    dtype=np.int64)
+        self.part_demand = np.zeros((len(tasks), len(self.parts)),
+                                    dtype=np.int64)
+        self.produced_part = np.full(len(tasks), -1, dtype=np.int64)
+        self.produced_quantity = np.zeros(len(tasks), dtype=np.int64)
+        offsets = [0]
+        tm_task = []; tm_machine = []; tm_duration = []; tm_value = []
+        self.tm_index = {}
+        for t, task in enumerate(tasks):
+            for tool in task.tools:
+                self.tool_demand[t, self.tool_index[tool.name]] += 1
+            for part in task.parts:
+                self.part_demand[t, self.part_index[part.name]] += 1
+            if (isinstance(task, PartsTask)):
+                self.produced_part[t] = self.part_index[task.produced_part.name]
+                self.produced_quantity[t] = task.quantity
+            for tm in task.task_machines:
+                self.tm_index[task.name, tm.machine.name] = len(tm_task)
+                tm_task.append(t)
+                tm_machine.append(self.machine_index[tm.machine.name])
+                tm_duration.append(tm.duration)
+                tm_value.append(tm.value)
+            offsets.append(len(tm_task))
+        self.task_offsets = np.array(offsets, dtype=np.int64)
+        self.tm_task = np.array(tm_task, dtype=np.int64)
+        self.tm_machine = np.array(tm_machine, dtype=np.int64)
+        self.tm_duration = np.array(tm_duration, dtype=np.int64)
+        self.tm_value = np.array(tm_value, dtype=np.int64)
+        self.tm_cost = (self.machine_energy[self.tm_machine] * self.tm_duration
+                        + (self.part_demand @ self.part_cost)[self.tm_task])
+
+        # Python copies of what the model builders read one item at a
+        #   time, which is faster than indexing the arrays
+        self.tm_costs = self.tm_cost.tolist()
+        self.task_tool_counts = self._counts(self.tool_demand, self.tools)
+        self.task_part_counts = self._counts(self.part_demand, self.parts)
+
+    # Number the objects by name, keeping the first object with each name
+    def _number(self, objects):
+        index = {}; numbered = []
+        for obj in objects:
+            if (not obj.name in index):
+                index[obj.name] = len(numbered)
+                numbered.append(obj)
+        return index, numbered
+
+    # For each task, a dictionary from the name of each tool or part it
+    #   needs to how many
+    def _counts(self, demand, objects):
+        counts = [{} for row in demand]
+        for t, i in zip(*np.nonzero(demand)):
+            counts[t][objects[i].name] = int(demand[t, i])
+        return counts
+
+    def cost(self, task, tm):
+        return self.tm_costs[self.tm_index[task.name, tm.machine.name]]
+
+# A read-only dictionary view of one of the flat variable lists of a
+#   JobScheduler, keyed by (job name, task name, machine name) as given by
+#   JobScheduler._key
+class KeyedView(Mapping):
+    def __init__(self, ids, values):
+        self.ids = ids
+        self.values_list = values
+
+    def __getitem__(self, key): return self.values_list[self.ids[key]]
+    def __contains__(self, key): return key in self.ids
+    def __iter__(self): return iter(self.ids)
+    def __len__(self): return len(self.ids)
+
 class JobScheduler():
     def __init__(self, name, deadline, jobs, tasks, machines, parts, tools,
                  use_costs, use_parts):
@@ -78,8 +363,55 @@ class JobScheduler():
 
         # Add any additional instance variables
         # BEGIN STUDENT CODE
+        # Solve profile (see SOLVE_PROFILES), and the status and best
+        #   objective bound of the last solve (see solve)
+        self.profile = None
+        self.status = None
+        self.bound = None
+        # Machines disabled with disable_machine
+        self.disabled_machines = set()
+        # Model options; set these before calling create_model
+        # linear_ordering: order tasks through one start/end variable per
+        #   job/task, rather than between every pair of machine alternatives
+        self.linear_ordering = False
+        # break_job_symmetry: jobs with identical task lists are
+        #   interchangeable, so schedule them in the order they are listed
+        self.break_job_symmetry = True
+        # break_machine_symmetry: machines that are interchangeable for
+        #   every task (see machine_classes) are used in the order listed
+        self.break_machine_symmetry = True
+        # cumulative_tools: model each tool as a cumulative resource over
+        #   the intervals of the tasks that use it, each taking as many
+        #   copies as the task needs, rather than as a reservoir with an
+        #   event per copy
+        self.cumulative_tools = False
+        # What has already been scheduled outside of this model, e.g., by
+        #   an earlier window of a rolling horizon (see rolling_horizon.py)
+        # release: no task can start earlier than this
+        # fixed_intervals: machine name -> list of (start, end) during
+        #   which the machine is already in use
+        # fixed_events: tool or part name -> list of (time, level change)
+        #   already in its reservoir
+        self.release = 1
+        self.fixed_intervals = {}
+        self.fixed_events = {}
+        # Instrumentation of the last model (see SchedulerStats), and where
+        #   to log it as JSON lines, if anywhere
+        self.stats = None
+        self.stats_log = None
+        # The columnar index of the order (see arrays)
+        self._arrays = None
+        # debug_names: give the model variables readable names, e.g.,
+        #   "J1-T1-M1-start"; otherwise only cost, value and objective are
+        #   named, which makes large models faster to build
+        self.debug_names = False
         # END STUDENT CODE
 
+    # The OrderArrays of the order, built when first needed
+    def arrays(self):
+        if (self._arrays is None): self._arrays = OrderArrays(self)
+        return self._arrays
+
     def _namelist(self, thelist):
         return "[%s]" %", ".join([element.name for element in thelist])
 
@@ -103,19 +435,86 @@ class JobScheduler():
     def _prefix(self, job, task, machine):
         return '%s-%s-%s' %self._key(job, task, machine)
 
+    # The name of a variable, from the given parts, if self.debug_names is
+    #   set; otherwise no name
+    def _name(self, *parts):
+        return '-'.join(parts) if self.debug_names else ''
+
+    # The variables of the task/machine combinations are kept in flat lists,
+    #   indexed by a dense id per combination (see create_job_task_variables).
+    #   These views give them by the keys of _key instead
+    @property
+    def starts(self): return KeyedView(self.var_ids, self.start_vars)
+    @property
+    def ends(self): return KeyedView(self.var_ids, self.end_vars)
+    @property
+    def scheduleds(self): return KeyedView(self.var_ids, self.sched_vars)
+    @property
+    def intervals(self): return KeyedView(self.var_ids, self.interval_vars)
+    @property
+    def durations(self): return KeyedView(self.var_ids, self.var_durations)
+    @property
+    def windows(self): return KeyedView(self.var_ids, self.var_windows)
+
     # max_constraint: add all constraints <= max_constraint
     # Constraints 5 and 6 are added only if self.use_parts is True
-    def create_model(self, max_constraint=6):
+    # profile: the solve profile used by solve (see SOLVE_PROFILES)
+    # cache: a model_cache.ModelCache; if the same model was built before
+    #   in this process, it is copied from the cache instead of being built
+    #   again
+    # Each pass is timed and sized in self.stats
+    def create_model(self, max_constraint=6, profile=None, cache=None):
+        self.profile = profile
+        self.max_constraint = max_constraint
+        self.stats = SchedulerStats(self.name, max_constraint, self.stats_log)
+        self.model = None
+        self._arrays = None
+        if (cache is not None and
+            self._build_pass('cache', cache.load, self, max_constraint)):
+            return
         self.model = cp_model.CpModel()
-        self.create_job_task_variables()
-        if (max_constraint >= 1): self.create_task_constraints()
-        if (max_constraint >= 2): self.create_machine_constraints()
-        if (max_constraint >= 3): self.create_task_ordering_constraints()
-        if (max_constraint >= 4): self.create_task_completion_constraints()
+        self.machine_constraints = {}
+        self.tool_constraints = {}
+        self.part_constraints = {}
+        self.cost_constraint = None
+        self.machine_symmetry_constraints = {}
+        self.removed_jobs = []
+        build = self._build_pass
+        build('variables', self.create_job_task_variables)
+        if (max_constraint >= 1): build('task', self.create_task_constraints)
+        if (max_constraint >= 2):
+            build('machine', self.create_machine_constraints)
+        if (max_constraint >= 3):
+            build('task_ordering', self.create_task_ordering_constraints)
+        if (max_constraint >= 4):
+            build('task_completion', self.create_task_completion_constraints)
+        if (max_constraint >= 4 and self.break_job_symmetry):
+            build('job_symmetry', self.create_job_symmetry_constraints)
+        if (self.break_machine_symmetry):
+            build('machine_symmetry', self.create_machine_symmetry_constraints)
         if (self.use_parts):
-            if (max_constraint >= 5): self.create_tools_constraints()
-            if (max_constraint >= 6): self.create_parts_constraints()
+            if (max_constraint >= 5):
+                build('tools', self.create_tools_constraints)
+            if (max_constraint >= 6):
+                build('parts', self.create_parts_constraints)
         self.add_optimization(max_constraint >= 7)
+        if (cache is not None): cache.store(self, max_constraint)
+
+    # Run one pass of create_model and record how long it took and what it
+    #   added to the model
+    def _build_pass(self, name, create, *args):
+        proto = self.model.Proto() if self.model else None
+        variables = len(proto.variables) if proto else 0
+        constraints = len(proto.constraints) if proto else 0
+        started = time.time()
+        result = create(*args)
+        seconds = time.time() - started
+        proto = self.model.Proto() if self.model else None
+        self.stats.add_pass(name, seconds,
+                            (len(proto.variables) if proto else 0) - variables,
+                            (len(proto.constraints) if proto else 0) -
+                            constraints)
+        return result
 
     # Create variables for each job/task/machine
     # You likely will need integer variables for the start and end of
@@ -123,81 +522,332 @@ class JobScheduler():
     #   a job, a Boolean variable for whether that task/machine combination
     #   was actually scheduled, and an interval variable that combines the
     #   start, end, and duration of the task
+    # Each task/machine combination gets the next id; its variables,
+    #   duration and time window are at that index of start_vars, end_vars,
+    #   sched_vars, interval_vars, var_durations and var_windows, its value
+    #   and cost (the coefficients of its scheduled variable in the
+    #   objective) at var_values and var_costs, and its key at var_keys
+    #   (var_ids maps the keys back to ids).  The ids of
+    #   a job are contiguous: job_ids holds their range (the latest one if
+    #   change_deadline created the job again), alternative_ids
+    #   the ids of each job/task, in the order of self.alternatives, and
+    #   machine_ids those of each machine
     def create_job_task_variables(self):
-        self.starts = {}
-        self.ends = {}
-        self.scheduleds = {}
-        self.intervals = {}
+        self.var_keys = []
+        self.var_ids = {}
+        self.start_vars = []
+        self.end_vars = []
+        self.sched_vars = []
+        self.interval_vars = []
+        self.var_durations = []
+        self.var_windows = []
+        self.var_values = []
+        self.var_costs = []
+        self.job_ids = {}
+        self.alternative_ids = {}
+        self.machine_ids = {}
+        self.job_enableds = {}
+        self.alternatives = {}
+        # Start/end of each job/task, used if self.linear_ordering is set
+        self.task_starts = {}
+        self.task_ends = {}
+        # Started literal of each job (constraint 4), and the jobs with
+        #   each list of task names (see create_job_symmetry_constraints)
+        self.job_starteds = {}
+        self.identical_jobs = {}
+        # Indexes filled as the variables are created, so that the
+        #   constraint passes do not have to rescan every job and task:
+        #   the (time, level change, active) reservoir events of each
+        #   tool/part, and with cumulative_tools, the (id, copies) of the
+        #   task/machine combinations that use each tool instead of its
+        #   events
+        self.tool_events = {}
+        self.tool_uses = {}
+        self.part_events = {}
 
         model = self.model
-        self.cost = model.NewIntVar(0, 1000000, "cost")
+        # Its bounds are set with those of the value and objective, once
+        #   all the variables exist (see _set_objective_bounds)
+        self.cost = model.NewIntVar(0, 0, "cost")
         for job in self.jobs:
-            for task in job.tasks:
-                for tm in task.task_machines:
-                    key = self._key(job, task, tm.machine)
-                    prefix = self._prefix(job, task, tm.machine)
-                    self.starts[key] = model.NewIntVar(1, self.deadline,
-                                                       prefix+"-start")
-                    self.ends[key] = model.NewIntVar(1, self.deadline,
-                                                     prefix+"-end")
-                    self.scheduleds[key] = model.NewBoolVar(prefix+"-sched")
-                    self.intervals[key] = \
-                         model.NewOptionalIntervalVar(self.starts[key],
-                                                      tm.duration,
-                                                      self.ends[key],
-                                                      self.scheduleds[key],
-                                                      prefix+"-int")
+            self._create_job_variables(job)
+
+    # Create the variables of a single job.  Each job also gets an
+    #   enforcement literal; none of its tasks can be scheduled while the
+    #   literal is false (see remove_job)
+    # Only task/machine combinations that fit in their time window get
+    #   variables; self.alternatives holds the TaskMachines that remain
+    #   for each job and task
+    def _create_job_variables(self, job):
+        model = self.model
+        name = self._name
+        self.job_enableds[job.name] = model.NewBoolVar(name(job.name,
+                                                            "enabled"))
+        windows = self._job_time_windows(job)
+        arrays = self.arrays()
+        first = len(self.var_keys)
+        for task in job.tasks:
+            alternatives = self.alternatives[job.name, task.name] = []
+            ids = self.alternative_ids[job.name, task.name] = []
+            t = arrays.task_index[task.name]
+            tool_counts = arrays.task_tool_counts[t]
+            part_counts = arrays.task_part_counts[t]
+            for tm in task.task_machines:
+                key = (job.name, task.name, tm.machine.name)
+                window = windows.get(key)
+                if (window is None): continue
+                earliest, latest = window
+                i = len(self.var_keys)
+                alternatives.append(tm)
+                ids.append(i)
+                self.var_ids[key] = i
+                self.var_keys.append(key)
+                self.var_windows.append(window)
+                self.var_durations.append(tm.duration)
+                self.var_values.append(tm.value)
+                self.var_costs.append(arrays.cost(task, tm))
+                start = model.NewIntVar(earliest, latest - tm.duration,
+                                        name(*key + ("start",)))
+                end = model.NewIntVar(earliest + tm.duration, latest,
+                                      name(*key + ("end",)))
+                sched = model.NewBoolVar(name(*key + ("sched",)))
+                self.start_vars.append(start)
+                self.end_vars.append(end)
+                self.sched_vars.append(sched)
+                self.interval_vars.append(
+                    model.NewOptionalIntervalVar(start, tm.duration, end,
+                                                 sched, name(*key + ("int",))))
+                if (tm.machine.name in self.disabled_machines):
+                    sched.with_domain(cp_model.Domain(0, 0))
+                self._index_task_machine(i, task, tool_counts, part_counts)
+        self.job_ids[job.name] = range(first, len(self.var_keys))
+
+    # Add a task/machine combination to the machine, tool and part indexes.
+    # Each copy of a tool is taken at the start and returned at the end;
+    #   each copy of a part is taken at the start, and parts made by a
+    #   PartsTask are returned at the end (see create_tools_constraints
+    #   and create_parts_constraints)
+    def _index_task_machine(self, i, task, tool_counts, part_counts):
+        start = self.start_vars[i]; end = self.end_vars[i]
+        sched = self.sched_vars[i]
+        self.machine_ids.setdefault(self.var_keys[i][2], []).append(i)
+        for tname in tool_counts:
+            if (self.cumulative_tools):
+                self.tool_uses.setdefault(tname, []).append(
+                    (i, tool_counts[tname]))
+                continue
+            events = self.tool_events.setdefault(tname, [])
+            for copy in range(tool_counts[tname]):
+                events.append((start, 1, sched))
+                events.append((end, -1, sched))
+        for pname in part_counts:
+            events = self.part_events.setdefault(pname, [])
+            for copy in range(part_counts[pname]):
+                events.append((start, 1, sched))
+        if (self.isPartsTask(task)):
+            self.part_events.setdefault(task.produced_part.name, []).append(
+                (end, -task.quantity, sched))
+
+    # Presolve: compute the time window (earliest start, latest end) of
+    #   each task/machine combination of a job, leaving out combinations
+    #   that cannot fit at all.
+    # Once the tasks of a job are done in sequence and either all or none
+    #   of them are scheduled (constraints 3 and 4), task k cannot start
+    #   before the shortest durations of tasks 0..k-1 have passed, and must
+    #   end early enough to leave room for the shortest durations of the
+    #   tasks after it.  Without those constraints, the only window is
+    #   [release, deadline]
+    def _job_time_windows(self, job):
+        release = self.release
+        fits = [[tm for tm in task.task_machines
+                 if release + tm.duration <= self.deadline]
+                for task in job.tasks]
+        if (self.max_constraint < 4):
+            return {self._key(job, task, tm.machine): (release, self.deadline)
+                    for task, tms in zip(job.tasks, fits) for tm in tms}
+
+        # If the shortest way of doing every task does not fit, the job
+        #   can never be scheduled
+        if (not all(fits)): return {}
+        min_durations = [min([tm.duration for tm in tms]) for tms in fits]
+        if (release + sum(min_durations) > self.deadline): return {}
+
+        windows = {}
+        earliest = release
+        after = sum(min_durations)
+        for task, tms, min_duration in zip(job.tasks, fits, min_durations):
+            after -= min_duration
+            latest = self.deadline - after
+            for tm in tms:
+                if (earliest + tm.duration <= latest):
+                    windows[self._key(job, task, tm.machine)] = (earliest,
+                                                                 latest)
+            earliest += min_duration
+        return windows
 
     # Add constraints such that, for each job, each task must 
     #   be achieved by only one machine
     def create_task_constraints(self):
-        model = self.model
         for job in self.jobs:
-            for task in job.tasks:
-                # BEGIN STUDENT CODE
-                scheduled_vars = []
-                for tm in task.task_machines:
-                    key = self._key(job, task, tm.machine)
-                    scheduled_vars.append(self.scheduleds[key])
-                model.Add(sum(scheduled_vars) <= 1)
-                # END STUDENT CODE
-                pass
+            self._create_task_constraints(job)
+
+    def _create_task_constraints(self, job):
+        model = self.model
+        enabled = self.job_enableds[job.name]
+        for task in job.tasks:
+            # BEGIN STUDENT CODE
+            scheduled_vars = [self.sched_vars[i] for i in
+                              self.alternative_ids[job.name, task.name]]
+            # At most one machine, and none at all if the job is disabled
+            model.Add(cp_model.LinearExpr.Sum(scheduled_vars) <= enabled)
+            # END STUDENT CODE
 
     # Add constraints such that each machine can handle only
     #   one task at a time
     def create_machine_constraints(self):
-        model = self.model
         for machine in self.machines:
-            # BEGIN STUDENT CODE
-            intervals = [
-                self.intervals[self._key(job, task, machine)]
-                for job in self.jobs
-                for task in job.tasks
-                for tm in task.task_machines
-                if tm.machine == machine
-            ]
+            self._create_machine_constraint(machine)
 
-            if intervals:
+    def _create_machine_constraint(self, machine):
+        model = self.model
+        # BEGIN STUDENT CODE
+        intervals = [self.interval_vars[i]
+                     for i in self.machine_ids.get(machine.name, [])]
+        fixed = self.fixed_intervals.get(machine.name, [])
+
+        if intervals and fixed:
+            intervals += [model.NewIntervalVar(start, end - start, end,
+                                               self._name(machine.name,
+                                                          "fixed", str(i)))
+                          for i, (start, end) in enumerate(fixed)]
+        if intervals:
+            self.machine_constraints[machine.name] = \
                 model.AddNoOverlap(intervals)
-            # END STUDENT CODE
-            pass
+        # END STUDENT CODE
+
+    # Group the machines that are interchangeable: they are free (not
+    #   disabled or partly in use already), have the same energy cost, and
+    #   every task of the order or its jobs (see OrderArrays) either cannot
+    #   be done on any of them or takes the same duration and has the same
+    #   value on each of them.
+    # Returns a list of the groups with more than one machine, each a
+    #   list of machines in the order they are listed
+    def machine_classes(self):
+        signatures = {}
+        for machine in self.machines: signatures[machine.name] = []
+        for task in self.arrays().tasks:
+            for tm in task.task_machines:
+                if (tm.machine.name in signatures):
+                    signatures[tm.machine.name].append((task.name, tm.duration,
+                                                        tm.value))
+        classes = {}
+        for machine in self.machines:
+            if (machine.name in self.disabled_machines or
+                self.fixed_intervals.get(machine.name)):
+                continue
+            signature = (machine.energy_cost,
+                         tuple(sorted(signatures[machine.name])))
+            classes.setdefault(signature, []).append(machine)
+        return [machines for machines in classes.values()
+                if len(machines) > 1]
+
+    # Swapping everything scheduled on two interchangeable machines gives
+    #   another schedule with the same objective.  To avoid searching
+    #   both, each machine in a class must have at least as many tasks
+    #   scheduled on it as the next one
+    def create_machine_symmetry_constraints(self):
+        model = self.model
+        for machines in self.machine_classes():
+            for m1, m2 in zip(machines, machines[1:]):
+                uses1 = [self.sched_vars[i]
+                         for i in self.machine_ids.get(m1.name, [])]
+                uses2 = [self.sched_vars[i]
+                         for i in self.machine_ids.get(m2.name, [])]
+                constraint = model.Add(cp_model.LinearExpr.Sum(uses1) >=
+                                       cp_model.LinearExpr.Sum(uses2))
+                self.machine_symmetry_constraints[m1.name, m2.name] = \
+                    constraint
+
+    # Remove the symmetry-breaking constraints between the given machine
+    #   and the others in its class, once they are no longer
+    #   interchangeable
+    def _clear_machine_symmetry_constraints(self, machine_name):
+        for pair in list(self.machine_symmetry_constraints):
+            if (machine_name in pair):
+                self._clear_constraint(
+                    self.machine_symmetry_constraints.pop(pair), 'linear')
 
     # For each job, add constraints such that the tasks of that job
     #   are done in sequence
     # Don't forgt that tasks can be achieved by different machines,
     #   and you need to account for that in the constraints
     def create_task_ordering_constraints(self):
-        model = self.model
         for job in self.jobs:
-            # BEGIN STUDENT CODE
-            for t1, t2 in zip(job.tasks, job.tasks[1:]):
-                for tm1 in t1.task_machines:
-                    for tm2 in t2.task_machines:
-                        key1 = self._key(job, t1, tm1.machine)
-                        key2 = self._key(job, t2, tm2.machine)
-                        model.Add(self.ends[key1] <= self.starts[key2]).OnlyEnforceIf([self.scheduleds[key1], self.scheduleds[key2]])
-            # END STUDENT CODE
-            pass
+            self._create_task_ordering_constraints(job)
+
+    def _create_task_ordering_constraints(self, job):
+        if (self.linear_ordering):
+            return self._create_linear_task_ordering_constraints(job)
+        model = self.model
+        # BEGIN STUDENT CODE
+        starts = self.start_vars; ends = self.end_vars
+        scheduleds = self.sched_vars
+        for t1, t2 in zip(job.tasks, job.tasks[1:]):
+            for i1 in self.alternative_ids[job.name, t1.name]:
+                for i2 in self.alternative_ids[job.name, t2.name]:
+                    model.Add(ends[i1] <= starts[i2]).OnlyEnforceIf([scheduleds[i1], scheduleds[i2]])
+        # END STUDENT CODE
+
+    # The pairwise constraints above grow with the product of the number
+    #   of alternatives of consecutive tasks.  Instead, order the tasks
+    #   through a single start/end per job/task (see _create_task_times)
+    def _create_linear_task_ordering_constraints(self, job):
+        model = self.model
+        for t1, t2 in zip(job.tasks, job.tasks[1:]):
+            model.Add(self._task_end(job, t1) <= self._task_start(job, t2))
+
+    def _task_start(self, job, task):
+        if (not (job.name, task.name) in self.task_starts):
+            self._create_task_times(job, task)
+        return self.task_starts[job.name, task.name]
+
+    def _task_end(self, job, task):
+        if (not (job.name, task.name) in self.task_ends):
+            self._create_task_times(job, task)
+        return self.task_ends[job.name, task.name]
+
+    # Create the start and end of a job/task, which equal the start and
+    #   end of whichever alternative is scheduled.
+    # The start/end of a task that is not scheduled is unconstrained, so,
+    #   as with the pairwise constraints, it does not order the tasks
+    #   around it
+    def _create_task_times(self, job, task):
+        model = self.model
+        ids = self.alternative_ids[job.name, task.name]
+        earliest, latest = self._task_time_window(job, task)
+        task_start = model.NewIntVar(earliest, latest,
+                                     self._name(job.name, task.name, "start"))
+        task_end = model.NewIntVar(earliest, latest,
+                                   self._name(job.name, task.name, "end"))
+        for i in ids:
+            model.Add(task_start == self.start_vars[i]).OnlyEnforceIf(
+                self.sched_vars[i])
+            model.Add(task_end == self.end_vars[i]).OnlyEnforceIf(
+                self.sched_vars[i])
+        self.task_starts[job.name, task.name] = task_start
+        self.task_ends[job.name, task.name] = task_end
+
+    # The (earliest, latest) times of the start/end of a job/task: the
+    #   union of the windows of its alternatives that still fit, or
+    #   [release, deadline] if none do (just release if the deadline is
+    #   before it, as the domain must not be empty)
+    def _task_time_window(self, job, task):
+        windows = ([self.var_windows[i]
+                    for i in self.alternative_ids[job.name, task.name]
+                    if self.var_windows[i]] or
+                   [(self.release, max(self.release, self.deadline))])
+        return (min([window[0] for window in windows]),
+                max([window[1] for window in windows]))
 
     # For each job, add constraints such that if a job is started it
     #   must be finished.  That is, either all tasks in a job are 
@@ -205,58 +855,80 @@ class JobScheduler():
     # Don't forgt that tasks can be achieved by different machines,
     #   and you need to account for that in the constraints
     def create_task_completion_constraints(self):
+        for job in self.jobs:
+            self._create_task_completion_constraints(job)
+
+    def _create_task_completion_constraints(self, job):
         model = self.model
+        # A job with a task that cannot fit has no variables at all
+        if (not all([self.alternatives[job.name, task.name]
+                     for task in job.tasks])):
+            return
+        # BEGIN STUDENT CODE
+        job_started = model.NewBoolVar(self._name(f"{job.name}_started"))
+        self.job_starteds[job.name] = job_started
+
+        for task in job.tasks:
+            task_scheduled_vars = [
+                self.sched_vars[i]
+                for i in self.alternative_ids[job.name, task.name]
+            ]
+            total = cp_model.LinearExpr.Sum(task_scheduled_vars)
+            model.Add(total == 1).OnlyEnforceIf(job_started)
+            model.Add(total == 0).OnlyEnforceIf(job_started.Not())
+        # END STUDENT CODE
+
+    # Jobs with identical task lists can trade schedules, so the search
+    #   would otherwise explore every permutation of them.  Once a job is
+    #   either fully scheduled or not at all (constraint 4), require that
+    #   a job is started only if the identical job listed before it is,
+    #   and that it does not start its first task earlier.
+    # A link is only enforced while the earlier job is enabled, so that
+    #   remove_job does not force the later jobs out of the schedule
+    def create_job_symmetry_constraints(self):
         for job in self.jobs:
-            # BEGIN STUDENT CODE
-            job_scheduled_vars = []
-            for task in job.tasks:
-                for tm in task.task_machines:
-                    key = self._key(job, task, tm.machine)
-                    job_scheduled_vars.append(self.scheduleds[key])
+            self._create_job_symmetry_constraints(job)
 
-            job_started = model.NewBoolVar(f"{job.name}_started")
+    def _create_job_symmetry_constraints(self, job):
+        if (not job.name in self.job_starteds): return
+        tnames = tuple([task.name for task in job.tasks])
+        identical = self.identical_jobs.setdefault(tnames, [])
+        if (identical): self._link_identical_jobs(identical[-1], job)
+        identical.append(job)
 
-            for task in job.tasks:
-                task_scheduled_vars = [
-                    self.scheduleds[self._key(job, task, tm.machine)]
-                    for tm in task.task_machines
-                ]
-                model.Add(sum(task_scheduled_vars) == 1).OnlyEnforceIf(job_started)
-                model.Add(sum(task_scheduled_vars) == 0).OnlyEnforceIf(job_started.Not())
-            # END STUDENT CODE
-            pass
+    # Link a job to the identical job before it in its chain
+    def _link_identical_jobs(self, previous, job):
+        model = self.model
+        enabled = self.job_enableds[previous.name]
+        model.AddImplication(self.job_starteds[job.name],
+                             self.job_starteds[previous.name]
+                             ).OnlyEnforceIf(enabled)
+        first = job.tasks[0]
+        model.Add(self._task_start(previous, first) <=
+                  self._task_start(job, first)).OnlyEnforceIf(
+                      [enabled, self.job_starteds[job.name]])
 
     # If a scheduled task needs a tool, it is removed from the pool at
     #   the start of the task and returned at the end.
     # Ensure that the number of tools in concurrent use is never
     #   greater than the pool size.
     def create_tools_constraints(self):
-        model = self.model
-        # BEGIN STUDENT CODE
         for tool in self.tools:
-            times = []
-            level_changes = []
-            actives = []
-
-            for job in self.jobs:
-                for task in job.tasks:
-                    required_tools = [t.name for t in task.tools]
-
-                    if tool.name in required_tools:
-                        tool_count = required_tools.count(tool.name)
-                        for tm in task.task_machines:
-                            key = self._key(job, task, tm.machine)
+            self._create_tool_constraint(tool)
 
-                            for i in range(tool_count):
-                                times.append(self.starts[key])
-                                level_changes.append(1)
-                                actives.append(self.scheduleds[key])
-
-                                times.append(self.ends[key])
-                                level_changes.append(-1)
-                                actives.append(self.scheduleds[key])
+    def _create_tool_constraint(self, tool):
+        model = self.model
+        if (self.cumulative_tools):
+            self._create_tool_cumulative(tool)
+            return
+        # BEGIN STUDENT CODE
+        events = self._reservoir_events(tool, self.tool_events)
+        times = [time for time, change, active in events]
+        level_changes = [change for time, change, active in events]
+        actives = [active for time, change, active in events]
 
-            if times and level_changes and actives:
+        if times and level_changes and actives:
+            self.tool_constraints[tool.name] = \
                 model.AddReservoirConstraintWithActive(
                     times=times,
                     level_changes=level_changes,
@@ -264,45 +936,63 @@ class JobScheduler():
                     min_level=0,
                     max_level=tool.num
                 )
-
         # END STUDENT CODE
-        pass
+
+    # Tools are returned when a task ends, so the copies in use at any time
+    #   are the total demand of the tasks running then.  The intervals of
+    #   the task/machine combinations that use the tool, each with the
+    #   number of copies its task needs, must never demand more than
+    #   tool.num.  Copies already in use (fixed_events) become fixed
+    #   intervals, one for each stretch of time with the same level
+    def _create_tool_cumulative(self, tool):
+        model = self.model
+        uses = self.tool_uses.get(tool.name, [])
+        if (not uses): return
+        intervals = [self.interval_vars[i] for i, copies in uses]
+        demands = [copies for i, copies in uses]
+        level = 0
+        events = sorted(self.fixed_events.get(tool.name, []))
+        for (time, change), (next_time, next_change) in zip(events, events[1:]):
+            level += change
+            if (level > 0 and next_time > time):
+                intervals.append(model.NewIntervalVar(
+                    time, next_time - time, next_time,
+                    self._name(tool.name, "fixed", str(time))))
+                demands.append(level)
+        self.tool_constraints[tool.name] = model.AddCumulative(intervals,
+                                                               demands,
+                                                               tool.num)
 
     def isPartsTask(self, task): return isinstance(task, PartsTask)
 
+    # The reservoir events of a tool or part in the model, preceded by any
+    #   fixed events, which are always active.  Without events in the
+    #   model, the fixed events cannot be violated and are left out
+    def _reservoir_events(self, item, index):
+        events = index.get(item.name, [])
+        if (not events): return events
+        return ([(time, change, True)
+                 for time, change in self.fixed_events.get(item.name, [])] +
+                events)
+
     # If a scheduled task needs a part, it is removed from the pool of parts
     #   at the *start* of the task.
     # If a scheduled PartsTask creates a part, the quantity of that part
     #   produced is added to the pool at the *end* of the task
     def create_parts_constraints(self):
+        for part in self.parts:
+            self._create_part_constraint(part)
+
+    def _create_part_constraint(self, part):
         model = self.model
         # BEGIN STUDENT CODE
-        for part in self.parts:
-            times = []
-            level_changes = []
-            actives = []
-
-            for job in self.jobs:
-                for task in job.tasks:
-                    required_parts = [p.name for p in task.parts]
-                    if part.name in required_parts:
-                        part_count = required_parts.count(part.name)
-                        for tm in task.task_machines:
-                            key = self._key(job, task, tm.machine)
-
-                            for i in range(part_count):
-                                times.append(self.starts[key])
-                                level_changes.append(1)
-                                actives.append(self.scheduleds[key])
-
-                    if self.isPartsTask(task) and part.name == task.produced_part.name:
-                        for tm in task.task_machines:
-                            key = self._key(job, task, tm.machine)
-                            times.append(self.ends[key])
-                            level_changes.append(-task.quantity)
-                            actives.append(self.scheduleds[key])
-
-            if times and level_changes and actives:
+        events = self._reservoir_events(part, self.part_events)
+        times = [time for time, change, active in events]
+        level_changes = [change for time, change, active in events]
+        actives = [active for time, change, active in events]
+
+        if times and level_changes and actives:
+            self.part_constraints[part.name] = \
                 model.AddReservoirConstraintWithActive(
                     times=times,
                     level_changes=level_changes,
@@ -311,61 +1001,452 @@ class JobScheduler():
                     max_level=part.quantity
                 )
         # END STUDENT CODE
-        pass
 
     # Set the self.value variable to be the total value of objects produced
     #  by all the scheduled tasks
     def add_values(self):
         model = self.model
-        self.value = model.NewIntVar(0, 1000000, "value")
-        values = []
-        for job in self.jobs:
-            for task in job.tasks:
-                for tm in task.task_machines:
-                    sched = self.scheduleds[self._key(job, task, tm.machine)]
-                    values.append(tm.value * sched)
-        model.Add(self.value == sum(values))        
+        self.value = model.NewIntVar(0, 0, "value")
+        self.value_constraint = model.Add(self.value == self._total_value())
+
+    # The sum is built in one piece from the value of each id, rather than
+    #   term by term.  It covers every id, including those of removed jobs,
+    #   so that it stays correct if they are added back; they contribute
+    #   nothing while disabled
+    def _total_value(self):
+        return cp_model.LinearExpr.WeightedSum(self.sched_vars,
+                                               self.var_values)
 
     # Set the self.cost variable to be the total cost of producing the objects,
     #   including both the energy costs of running the machines and the 
     #   costs of the parts used
     def add_costs(self):
         model = self.model
-        # BEGIN STUDENT CODE
-        total_costs = []
+        self.cost_constraint = model.Add(self.cost == self._total_cost())
 
-        for job in self.jobs:
-            for task in job.tasks:
-                for tm in task.task_machines:
-                    key = self._key(job, task, tm.machine)
-                    energy_cost = tm.machine.energy_cost * tm.duration
-                    total_costs.append(energy_cost * self.scheduleds[key])
-
-        for job in self.jobs:
-            for task in job.tasks:
-                required_parts = [p.name for p in task.parts]
-                for part in self.parts:
-                    if part.name in required_parts:
-                        part_count = required_parts.count(part.name)
-                        for tm in task.task_machines:
-                            key = self._key(job, task, tm.machine)
-                            part_cost = part_count * part.cost
-                            total_costs.append(part_cost * self.scheduleds[key])
-
-        model.Add(self.cost == sum(total_costs))
+    def _total_cost(self):
+        # BEGIN STUDENT CODE
+        # The energy and part costs of each id were taken from the arrays
+        #   (OrderArrays.tm_cost) as its variables were created
+        return cp_model.LinearExpr.WeightedSum(self.sched_vars,
+                                               self.var_costs)
         # END STUDENT CODE
 
 
     def add_optimization(self, add_costs):
         model = self.model
-        self.objective = model.NewIntVar(0, 1000000, "objective")
-        self.add_values()
+        self.objective = model.NewIntVar(0, 0, "objective")
+        self._build_pass('values', self.add_values)
         if (self.use_costs and add_costs):
-            self.add_costs()
+            self._build_pass('costs', self.add_costs)
             model.Add(self.objective == (self.value - self.cost))
         else:
             model.Add(self.objective == self.value)
+        self._set_objective_bounds()
         model.Maximize(self.objective)
+
+    # The lowest and highest possible totals of the coefficients (one per
+    #   id, as in var_values) when at most one alternative of each
+    #   job/task is scheduled.  id_lists holds the ids of each job/task
+    def _total_bounds(self, coefficients, id_lists):
+        low = high = 0
+        for ids in id_lists:
+            if (ids):
+                task_coefficients = [coefficients[i] for i in ids]
+                low += min(0, min(task_coefficients))
+                high += max(0, max(task_coefficients))
+        return low, high
+
+    # Bound the value, cost and objective variables by what the tasks of
+    #   the order can add up to, rather than by a fixed constant.  Tight
+    #   bounds help the solver propagate the objective, and they grow
+    #   with the order, so big orders are not cut off.  With costs, the
+    #   objective can be negative.
+    # Removed jobs are included, so the bounds stay valid if they are added
+    #   back.  Given a job that has just been added, the current bounds
+    #   are widened by what it can add, rather than recomputed
+    def _set_objective_bounds(self, job=None):
+        if (job is None):
+            id_lists = self.alternative_ids.values()
+            value_low = value_high = cost_low = cost_high = 0
+        else:
+            id_lists = [self.alternative_ids[job.name, task.name]
+                        for task in job.tasks]
+            value_low, value_high = self._domain(self.value)
+            cost_low, cost_high = self._domain(self.cost)
+        low, high = self._total_bounds(self.var_values, id_lists)
+        value_low += low; value_high += high
+        self.value.with_domain(cp_model.Domain(value_low, value_high))
+        if (self.cost_constraint is not None):
+            low, high = self._total_bounds(self.var_costs, id_lists)
+            cost_low += low; cost_high += high
+            self.cost.with_domain(cp_model.Domain(cost_low, cost_high))
+            self.objective.with_domain(cp_model.Domain(value_low - cost_high,
+                                                       value_high - cost_low))
+        else:
+            self.objective.with_domain(cp_model.Domain(value_low, value_high))
+
+    ##########################################################
+    #   INCREMENTAL ORDER EDITING
+    ##########################################################
+    # These functions change the order of an existing model in place,
+    #   reusing its variables and constraints.  Only the constraints that
+    #   mention a changed job, machine, tool or part are rebuilt; removing
+    #   jobs, moving the deadline earlier and changing machines only
+    #   change variable domains, so they can be undone cheaply
+
+    # CP-SAT constraints cannot be deleted, so a constraint that has to be
+    #   rebuilt is emptied in place.  kind is the constraint type field
+    #   ('no_overlap', 'reservoir', 'cumulative' or 'linear')
+    def _clear_constraint(self, constraint, kind):
+        proto = self.model.Proto().constraints[constraint.Index()]
+        getattr(proto, 'clear_' + kind)()
+
+    # The (lowest, highest) values of a variable, which must have a single
+    #   interval as its domain
+    def _domain(self, var):
+        domain = list(self.model.Proto().variables[var.Index()].domain)
+        return domain[0], domain[-1]
+
+    # Add the terms coefficients[i] * sched_vars[i] for the ids to the sum
+    #   of a constraint total == sum, in place, so that adding a job does
+    #   not rebuild the whole sum
+    def _extend_total(self, constraint, total, coefficients, ids):
+        linear = self.model.Proto().constraints[constraint.Index()].linear
+        # The terms are stored on one side, with total, so their sign is
+        #   the opposite of that of total
+        sign = -linear.coeffs[list(linear.vars).index(total.Index())]
+        for i in ids:
+            if (coefficients[i]):
+                linear.vars.append(self.sched_vars[i].Index())
+                linear.coeffs.append(sign * coefficients[i])
+
+    # Add the item to the list unless it has an item with the same name.
+    #   Returns whether it was added
+    def _add_to_order(self, item, items):
+        if (get_named(item.name, items)): return False
+        items.append(item)
+        return True
+
+    # Add a new job to the model.  A job that was removed with remove_job
+    #   is re-enabled instead
+    # Only the variables and constraints of the new job are created, and
+    #   the value and cost sums and their bounds are extended in place.
+    #   The constraints of the machines, tools and parts the job uses are
+    #   rebuilt, which takes time in proportion to their uses in the whole
+    #   order.  A job with tasks, machines, tools or parts the order does
+    #   not have yet also rebuilds the order arrays (see arrays) and, if
+    #   it brings new tasks, regroups the interchangeable machines; both
+    #   scale with the order
+    def add_job(self, job):
+        if (get_named(job.name, self.jobs)):
+            raise Exception("Job %s is already in order %s"
+                            %(job.name, self.name))
+        removed = get_named(job.name, self.removed_jobs)
+        if (removed):
+            if ([t.name for t in job.tasks] != [t.name for t in removed.tasks]):
+                raise Exception("Job %s was removed from order %s and cannot be redefined"
+                                %(job.name, self.name))
+            self.removed_jobs.remove(removed)
+            self.jobs.append(removed)
+            self.job_enableds[job.name].with_domain(cp_model.Domain(0, 1))
+            return
+
+        machines, tools, parts = self._job_items(job)
+        new_tasks = False; new_items = False
+        for task in job.tasks:
+            new_tasks |= self._add_to_order(task, self.tasks)
+            new_items |= (self._arrays is not None and
+                          not task.name in self._arrays.task_index)
+        for machine in machines:
+            new_items |= self._add_to_order(machine, self.machines)
+        for tool in tools: new_items |= self._add_to_order(tool, self.tools)
+        for part in parts: new_items |= self._add_to_order(part, self.parts)
+        self.jobs.append(job)
+        if (new_tasks or new_items): self._arrays = None
+
+        # The new tasks may make machines that were interchangeable differ
+        if (new_tasks and self.machine_symmetry_constraints):
+            classes = [set([machine.name for machine in machines])
+                       for machines in self.machine_classes()]
+            for m1, m2 in list(self.machine_symmetry_constraints):
+                if (not any([m1 in names and m2 in names
+                             for names in classes])):
+                    self._clear_machine_symmetry_constraints(m1)
+
+        self._create_job_model(job, machines, tools, parts)
+        if (self.max_constraint >= 4 and self.break_job_symmetry):
+            self._create_job_symmetry_constraints(job)
+
+    # The machines, tools and parts the tasks of a job use, each listed once
+    def _job_items(self, job):
+        machines = []; tools = []; parts = []
+        for task in job.tasks:
+            for tm in task.task_machines:
+                self._add_to_order(tm.machine, machines)
+            for tool in task.tools: self._add_to_order(tool, tools)
+            for part in task.parts: self._add_to_order(part, parts)
+            if (self.isPartsTask(task)):
+                self._add_to_order(task.produced_part, parts)
+        return machines, tools, parts
+
+    # Create the variables and constraints of a job, except for the job
+    #   symmetry, rebuild the constraints of the machines, tools and parts
+    #   it uses, and add it to the value and cost sums
+    def _create_job_model(self, job, machines, tools, parts):
+        max_constraint = self.max_constraint
+        self._create_job_variables(job)
+        if (max_constraint >= 1): self._create_task_constraints(job)
+        if (max_constraint >= 2):
+            for machine in machines:
+                if (machine.name in self.machine_constraints):
+                    self._clear_constraint(
+                        self.machine_constraints[machine.name], 'no_overlap')
+                self._create_machine_constraint(machine)
+        if (max_constraint >= 3): self._create_task_ordering_constraints(job)
+        if (max_constraint >= 4): self._create_task_completion_constraints(job)
+        if (self.use_parts):
+            if (max_constraint >= 5):
+                for tool in tools:
+                    if (tool.name in self.tool_constraints):
+                        self._clear_constraint(
+                            self.tool_constraints[tool.name],
+                            'cumulative' if self.cumulative_tools
+                            else 'reservoir')
+                    self._create_tool_constraint(tool)
+            if (max_constraint >= 6):
+                for part in parts:
+                    if (part.name in self.part_constraints):
+                        self._clear_constraint(
+                            self.part_constraints[part.name], 'reservoir')
+                    self._create_part_constraint(part)
+
+        ids = self.job_ids[job.name]
+        self._extend_total(self.value_constraint, self.value,
+                           self.var_values, ids)
+        if (self.cost_constraint is not None):
+            self._extend_total(self.cost_constraint, self.cost,
+                               self.var_costs, ids)
+        self._set_objective_bounds(job)
+
+    # Remove a job from the order by disabling it; its variables and
+    #   constraints stay in the model so that add_job can bring it back
+    def remove_job(self, job_name):
+        job = get_named(job_name, self.jobs)
+        if (not job):
+            raise Exception("Job %s is not in order %s" %(job_name, self.name))
+        self.jobs.remove(job)
+        self.removed_jobs.append(job)
+        self.job_enableds[job_name].with_domain(cp_model.Domain(0, 0))
+
+    # Change the deadline by which all scheduled tasks must be finished.
+    # A job that a later deadline gives task/machine combinations that the
+    #   time-window presolve left out of the model is created again, as
+    #   add_job would create it (see _recreate_job); the other jobs only
+    #   have their variable domains changed
+    def change_deadline(self, deadline):
+        old_deadline = self.deadline
+        self.deadline = deadline
+        new_windows = {}
+        for job in self.jobs + self.removed_jobs:
+            windows = self._job_time_windows(job)
+            if (any([not key in self.var_ids for key in windows])):
+                self._recreate_job(job)
+            new_windows.update(windows)
+        for i, key in enumerate(self.var_keys):
+            # Left behind by _recreate_job
+            if (self.var_ids[key] != i): continue
+            window = self.var_windows[i] = new_windows.get(key)
+            if (window):
+                earliest, latest = window
+                duration = self.var_durations[i]
+                self.start_vars[i].with_domain(
+                    cp_model.Domain(earliest, latest - duration))
+                self.end_vars[i].with_domain(
+                    cp_model.Domain(earliest + duration, latest))
+                if (not key[2] in self.disabled_machines):
+                    self.sched_vars[i].with_domain(cp_model.Domain(0, 1))
+            else:
+                # No longer fits: never scheduled, so its start and end
+                #   only need non-empty domains
+                latest = max(self.release, old_deadline)
+                self.start_vars[i].with_domain(
+                    cp_model.Domain(self.release, latest))
+                self.end_vars[i].with_domain(
+                    cp_model.Domain(self.release, latest))
+                self.sched_vars[i].with_domain(cp_model.Domain(0, 0))
+        # The start/end of each job/task (linear_ordering, and the first
+        #   tasks of identical jobs) spans the windows of its alternatives,
+        #   which have just changed
+        self._reset_task_times()
+
+    # Give a job new variables and constraints for the current deadline.
+    # Its old variables cannot be deleted, so they are never scheduled,
+    #   and its old enabled and started literals are false, which makes
+    #   every constraint that mentions them hold.  var_ids and the other
+    #   indexes then refer to the new ids only.  The job keeps its place
+    #   in its chain of identical jobs, linked to its neighbours again.
+    # The machine symmetry sums do not count the new ids; counting only
+    #   some of the tasks on each machine still breaks symmetry soundly
+    def _recreate_job(self, job):
+        unscheduled = cp_model.Domain(0, 0)
+        old_ids = self.job_ids[job.name]
+        retired = set()
+        machines, tools, parts = self._job_items(job)
+        for i in old_ids:
+            self.sched_vars[i].with_domain(unscheduled)
+            self.var_windows[i] = None
+            retired.add(self.sched_vars[i].Index())
+        self.job_enableds[job.name].with_domain(unscheduled)
+        if (job.name in self.job_starteds):
+            self.job_starteds[job.name].with_domain(unscheduled)
+        for task in job.tasks:
+            self.task_starts.pop((job.name, task.name), None)
+            self.task_ends.pop((job.name, task.name), None)
+        for machine in machines:
+            if (machine.name in self.machine_ids):
+                self.machine_ids[machine.name] = [
+                    i for i in self.machine_ids[machine.name]
+                    if not i in old_ids]
+        for tool in tools:
+            if (tool.name in self.tool_uses):
+                self.tool_uses[tool.name] = [
+                    (i, copies) for i, copies in self.tool_uses[tool.name]
+                    if not i in old_ids]
+            if (tool.name in self.tool_events):
+                self.tool_events[tool.name] = [
+                    event for event in self.tool_events[tool.name]
+                    if not event[2].Index() in retired]
+        for part in parts:
+            if (part.name in self.part_events):
+                self.part_events[part.name] = [
+                    event for event in self.part_events[part.name]
+                    if not event[2].Index() in retired]
+
+        self._create_job_model(job, machines, tools, parts)
+        if (job in self.removed_jobs):
+            self.job_enableds[job.name].with_domain(unscheduled)
+        if (self.max_constraint >= 4 and self.break_job_symmetry and
+            job.name in self.job_starteds):
+            tnames = tuple([task.name for task in job.tasks])
+            identical = self.identical_jobs.get(tnames, [])
+            if (not job in identical):
+                self._create_job_symmetry_constraints(job)
+                return
+            index = identical.index(job)
+            if (index > 0):
+                self._link_identical_jobs(identical[index-1], job)
+            if (index+1 < len(identical)):
+                self._link_identical_jobs(job, identical[index+1])
+
+    def _reset_task_times(self):
+        for job in self.jobs + self.removed_jobs:
+            for task in job.tasks:
+                if (not (job.name, task.name) in self.task_starts): continue
+                earliest, latest = self._task_time_window(job, task)
+                self.task_starts[job.name, task.name].with_domain(
+                    cp_model.Domain(earliest, latest))
+                self.task_ends[job.name, task.name].with_domain(
+                    cp_model.Domain(earliest, latest))
+
+    # Prevent any task from being scheduled on the given machine
+    # Any symmetry breaking that involves the machine no longer holds
+    def disable_machine(self, machine_name):
+        self.disabled_machines.add(machine_name)
+        self._clear_machine_symmetry_constraints(machine_name)
+        for i in self.machine_ids.get(machine_name, []):
+            self.sched_vars[i].with_domain(cp_model.Domain(0, 0))
+
+    # Undo disable_machine
+    def enable_machine(self, machine_name):
+        self.disabled_machines.discard(machine_name)
+        for i in self.machine_ids.get(machine_name, []):
+            if (self.var_windows[i]):
+                self.sched_vars[i].with_domain(cp_model.Domain(0, 1))
+
+    # Match the entries of a job in a solution dictionary to the tasks of
+    #   that job.  Entries are in task order, but tasks that were not
+    #   scheduled have no entry, so each entry is matched to the next
+    #   task that can be done on its machine.
+    # Returns a list of (task, machine name, start, duration) tuples
+    def match_solution_tasks(self, job, entries):
+        matched = []
+        tasks = iter(job.tasks)
+        for mname, start, duration in entries:
+            for task in tasks:
+                if (mname in [tm.machine.name for tm in task.task_machines]):
+                    matched.append((task, mname, start, duration))
+                    break
+        return matched
+
+    # Use a previous solution, in the format returned by solve, as a hint
+    #   for the next solve.  Every task/machine combination in the solution
+    #   is hinted as scheduled at its start time; all others are hinted as
+    #   not scheduled.  Jobs, tasks and machines that are not part of this
+    #   order are ignored, so a schedule for a slightly different order can
+    #   be used to warm-start a re-plan.
+    # The solution is first put in the order the symmetry-breaking
+    #   constraints require (see _symmetry_order), as CP-SAT would
+    #   otherwise reject it as a first solution
+    def apply_hint(self, solution):
+        model = self.model
+        model.ClearHints()
+        solution = self._symmetry_order(solution)
+        chosen = {}
+        for job in self.jobs:
+            for task, mname, start, duration in \
+                    self.match_solution_tasks(job, solution.get(job.name, [])):
+                chosen[job.name, task.name, mname] = start
+        for key, i in self.var_ids.items():
+            if (key in chosen):
+                model.AddHint(self.sched_vars[i], True)
+                model.AddHint(self.start_vars[i], chosen[key])
+                model.AddHint(self.end_vars[i], chosen[key] +
+                              self.var_durations[i])
+            else:
+                model.AddHint(self.sched_vars[i], False)
+
+    # An equivalent solution that meets the symmetry-breaking constraints:
+    #   the machines of each chain of interchangeable machines are
+    #   relabelled so that the ones listed first are used most, and the
+    #   schedules of identical jobs are moved so that the jobs listed first
+    #   are the ones started, in the order of the start of their first task.
+    #   A removed job breaks the chain of identical jobs it is in
+    def _symmetry_order(self, solution):
+        solution = dict(solution)
+        successors = dict(self.machine_symmetry_constraints.keys())
+        followers = set(successors.values())
+        names = {}
+        for head in [m1 for m1 in successors if not m1 in followers]:
+            chain = [head]
+            while (chain[-1] in successors): chain.append(successors[chain[-1]])
+            uses = dict([(name, 0) for name in chain])
+            for entries in solution.values():
+                for mname, start, duration in entries:
+                    if (mname in uses): uses[mname] += 1
+            ranked = sorted(chain, key=lambda name: -uses[name])
+            names.update(zip(ranked, chain))
+        if (names):
+            solution = dict([(jname, [(names.get(mname, mname), start, duration)
+                                      for mname, start, duration in entries])
+                             for jname, entries in solution.items()])
+
+        enabled = set([job.name for job in self.jobs])
+        for jobs in self.identical_jobs.values():
+            chains = [[]]
+            for job in jobs:
+                if (job.name in enabled): chains[-1].append(job.name)
+                else: chains.append([])
+            for chain in chains:
+                schedules = sorted([solution.pop(jname) for jname in chain
+                                    if solution.get(jname)],
+                                   key=lambda entries: min([start for mname,
+                                                            start, duration
+                                                            in entries]))
+                for jname in chain: solution.pop(jname, None)
+                solution.update(zip(chain, schedules))
+        return solution
+
     # If the status is not INFEASIBLE, return a dictionary of scheduled jobs,
     #   where the job name is the dictionary key and the value is a list of
     #   tuples of the machine names that accomplish each task the start/end
@@ -373,22 +1454,128 @@ class JobScheduler():
     # For instance, solution['j1'] = [('m1', 0, 1), ('m3', 3, 2)]
     #   indicates that job j1 has two tasks, the first starts at time 0 and
     #   runs for one hour; the second starts at time 3 and runs for 2 hours
-    def solve(self):
-        solver = cp_model.CpSolver()
-        status = solver.Solve(self.model)
-        if (status == cp_model.INFEASIBLE):
+    # profile overrides the profile given to create_model; the name of the
+    #   resulting status (e.g., OPTIMAL or FEASIBLE) is kept in self.status,
+    #   and the best bound on the objective in self.bound (None without a
+    #   schedule).  CP-SAT reports OPTIMAL when it stops on the profile's
+    #   relative_gap or absolute_gap; self.status is then FEASIBLE, as the
+    #   schedule is only optimal if its objective reaches the bound
+    # No schedule is returned if the profile's time limit was reached
+    #   before any solution was found
+    # hint: a previous solution used to warm-start the search (see apply_hint)
+    # callback: called as callback(solution, objective, bound, wall_time)
+    #   with each improving solution found during the search
+    def solve(self, profile=None, hint=None, callback=None):
+        return self._run_solver(self._create_solver(profile, hint), callback)
+
+    def _run_solver(self, solver, callback=None):
+        if (callback is None):
+            status = solver.Solve(self.model)
+        else:
+            status = solver.Solve(self.model, SolutionStreamer(self, callback))
+        solved = self._record_status(solver, status)
+        if (not solved):
             return None, solver
         else:
-            solution = {}
-            for job in self.jobs:
-                sched_machines = []
-                for task in job.tasks:
-                    for tm in task.task_machines:
-                        key = self._key(job, task, tm.machine)
-                        if solver.Value(self.scheduleds[key]):
-                            start = int(solver.Value(self.starts[key]))
-                            sched_machines.append((tm.machine.name, start,
-                                                   tm.duration))
-                if (len(sched_machines) > 0):
-                    solution[job.name] = sched_machines
-            return solution, solver
+            return self._solution(solver.Value), solver
+
+    # Set self.status and self.bound (see solve) and the stats of a
+    #   finished solve.  Returns whether a schedule was found
+    def _record_status(self, solver, status):
+        solved = status in (cp_model.OPTIMAL, cp_model.FEASIBLE)
+        self.status = solver.StatusName(status)
+        self.bound = None
+        if (solved):
+            self.bound = int(round(solver.BestObjectiveBound()))
+            if (int(round(solver.ObjectiveValue())) < self.bound):
+                self.status = solver.StatusName(cp_model.FEASIBLE)
+        if (self.stats is not None): self.stats.add_solve(solver, status, solved)
+        return solved
+
+    def _create_solver(self, profile, hint):
+        if (hint is not None): self.apply_hint(hint)
+        return configure_solver(cp_model.CpSolver(),
+                                self.profile if profile is None else profile)
+
+    # Build the solution dictionary (see solve), where value returns the
+    #   value of a variable in the solution
+    def _solution(self, value):
+        solution = {}
+        for job in self.jobs:
+            sched_machines = []
+            for task in job.tasks:
+                for tm, i in zip(self.alternatives[job.name, task.name],
+                                 self.alternative_ids[job.name, task.name]):
+                    if value(self.sched_vars[i]):
+                        start = int(value(self.start_vars[i]))
+                        sched_machines.append((tm.machine.name, start,
+                                               tm.duration))
+            if (len(sched_machines) > 0):
+                solution[job.name] = sched_machines
+        return solution
+
+    # Build the model (if max_constraint is given, or there is none yet)
+    #   and solve it without blocking the event loop: both run in the
+    #   loop's default executor.  At most MAX_CONCURRENT_SOLVES of these
+    #   run at once; the others wait for a slot.
+    # Cancelling the calling task stops the search; the cancellation is
+    #   passed on once the solver has stopped.
+    # Returns the same (solution, solver) pair as solve
+    async def solve_async(self, max_constraint=None, profile=None, hint=None):
+        loop = asyncio.get_running_loop()
+        async with solve_slots():
+            if (max_constraint is not None or self.model is None):
+                await _run_to_completion(loop.run_in_executor(
+                    None, self.create_model,
+                    6 if max_constraint is None else max_constraint,
+                    self.profile if profile is None else profile))
+            solver = await _run_to_completion(loop.run_in_executor(
+                None, self._create_solver, profile, hint))
+            return await _run_to_completion(
+                loop.run_in_executor(None, self._run_solver, solver),
+                solver.StopSearch)
+
+    # Generate each improving solution as soon as the search finds it, as
+    #   (solution, objective, bound, wall_time) tuples.  The search runs in
+    #   a separate thread and is stopped if the generator is closed before
+    #   the search ends; self.status and self.bound are set once it does
+    #   end
+    def solve_iter(self, profile=None, hint=None):
+        solver = self._create_solver(profile, hint)
+        results = queue.Queue()
+        done = object()
+        streamer = SolutionStreamer(self, lambda *result: results.put(result))
+        errors = []; statuses = []
+        def search():
+            try:
+                statuses.append(solver.Solve(self.model, streamer))
+            except Exception as error:
+                errors.append(error)
+            finally:
+                results.put(done)
+        thread = threading.Thread(target=search, daemon=True)
+        thread.start()
+        try:
+            while True:
+                result = results.get()
+                if (result is done): break
+                yield result
+        finally:
+            streamer.StopSearch()
+            thread.join()
+            # Recorded as in _run_solver, also when the caller stops early
+            if (statuses): self._record_status(solver, statuses[0])
+        if (errors): raise errors[0]
+
+# Pass each solution that CP-SAT finds for a JobScheduler model to
+#   on_solution, as (solution, objective, bound, wall_time)
+class SolutionStreamer(cp_model.CpSolverSolutionCallback):
+    def __init__(self, scheduler, on_solution):
+        super(SolutionStreamer, self).__init__()
+        self.scheduler = scheduler
+        self.on_solution = on_solution
+
+    def on_solution_callback(self):
+        self.on_solution(self.scheduler._solution(self.Value),
+                         int(self.ObjectiveValue()),
+                         int(self.BestObjectiveBound()), self.WallTime())
@@ -0,0 +1,146 @@
+import random, time
+from ortools.sat.python import cp_model
+import heuristic_scheduler as hs
+
+# Large Neighborhood Search on top of the CP-SAT model of a JobScheduler.
+# Starting from an incumbent schedule, each step frees a neighborhood of
+#   jobs (those in a time window, those on a subset of machines, or a
+#   random subset), fixes every other job to its incumbent schedule, and
+#   re-solves the model for a short time.  Improvements become the new
+#   incumbent.
+# Jobs are fixed by narrowing the domains of their existing scheduleds,
+#   starts and ends variables, and the domains are restored after each
+#   step, so the model is only built once
+
+neighborhoods = ['time_window', 'machines', 'jobs']
+
+class LNSScheduler:
+    # order: a JobScheduler; its model is created here, without the
+    #   symmetry-breaking constraints, which an arbitrary incumbent need
+    #   not satisfy
+    # fraction: the share of the jobs, machines or horizon to free
+    def __init__(self, order, max_constraint=7, fraction=0.3, seed=0):
+        self.order = order
+        self.max_constraint = max_constraint
+        self.fraction = fraction
+        self.random = random.Random(seed)
+        self.use_costs = order.use_costs and max_constraint >= 7
+        order.break_job_symmetry = False
+        order.break_machine_symmetry = False
+        order.create_model(max_constraint)
+
+    def _size(self, n):
+        return max(1, int(round(self.fraction * n)))
+
+    # The names of jobs that are not scheduled in the incumbent
+    def _unscheduled(self, incumbent):
+        return [job.name for job in self.order.jobs
+                if not job.name in incumbent]
+
+    # Free the jobs with a task in a random window of the horizon, and
+    #   some of the unscheduled jobs
+    def _time_window(self, incumbent):
+        deadline = self.order.deadline
+        width = self._size(deadline)
+        first = self.random.randint(1, max(1, deadline - width))
+        free = set([jname for jname in incumbent
+                    if any([start < first + width and first < start + duration
+                            for mname, start, duration in incumbent[jname]])])
+        unscheduled = self._unscheduled(incumbent)
+        free.update(self.random.sample(unscheduled,
+                                       min(len(unscheduled),
+                                           self._size(len(self.order.jobs)))))
+        return free
+
+    # Free the jobs that use a random subset of the machines, or could
+    #   use them if they are not scheduled
+    def _machines(self, incumbent):
+        machines = self.order.machines
+        names = set([machine.name for machine in
+                     self.random.sample(machines, self._size(len(machines)))])
+        free = set()
+        for job in self.order.jobs:
+            if (job.name in incumbent):
+                used = [mname for mname, start, duration in incumbent[job.name]]
+            else:
+                used = [tm.machine.name for task in job.tasks
+                        for tm in task.task_machines]
+            if (names.intersection(used)): free.add(job.name)
+        return free
+
+    def _jobs(self, incumbent):
+        jobs = self.order.jobs
+        return set([job.name for job in
+                    self.random.sample(jobs, self._size(len(jobs)))])
+
+    # Fix every job that is not free to its incumbent schedule.  Returns
+    #   the original domains of the variables that were changed
+    def _fix(self, incumbent, free):
+        order = self.order
+        proto = order.model.Proto()
+        saved = []
+        def set_domain(var, lo, hi):
+            saved.append((var, list(proto.variables[var.Index()].domain)))
+            var.with_domain(cp_model.Domain(lo, hi))
+        for job in order.jobs:
+            if (job.name in free): continue
+            chosen = {}
+            for task, mname, start, duration in \
+                    order.match_solution_tasks(job, incumbent.get(job.name, [])):
+                chosen[task.name, mname] = start
+            for task in job.tasks:
+                for tm in order.alternatives[job.name, task.name]:
+                    key = order._key(job, task, tm.machine)
+                    if ((task.name, tm.machine.name) in chosen):
+                        start = chosen[task.name, tm.machine.name]
+                        set_domain(order.scheduleds[key], 1, 1)
+                        set_domain(order.starts[key], start, start)
+                        set_domain(order.ends[key], start + tm.duration,
+                                   start + tm.duration)
+                    else:
+                        set_domain(order.scheduleds[key], 0, 0)
+        return saved
+
+    def _restore(self, saved):
+        for var, domain in reversed(saved):
+            var.with_domain(cp_model.Domain.FromFlatIntervals(domain))
+
+    # Improve the incumbent (by default, the best heuristic schedule) for
+    #   the given number of steps or until time_limit seconds have passed.
+    # Each step is solved with the step_profile solve profile.
+    # Returns the best schedule and a list of (seconds, objective) pairs,
+    #   one for the incumbent and one for each improvement.  The model is
+    #   left with the last incumbent as its hint
+    def run(self, incumbent=None, steps=100, time_limit=None,
+            step_profile={'time_limit': 1.0}):
+        order = self.order
+        started = time.time()
+        if (incumbent is None):
+            incumbent = hs.best_heuristic_schedule(order, self.use_costs)
+        best = hs.evaluate(order, incumbent, self.use_costs)[0]
+        history = [(time.time() - started, best)]
+        for step in range(steps):
+            if (time_limit is not None and time.time() - started > time_limit):
+                break
+            kind = neighborhoods[step % len(neighborhoods)]
+            free = getattr(self, '_' + kind)(incumbent)
+            saved = self._fix(incumbent, free)
+            try:
+                solution, solver = order.solve(step_profile, incumbent)
+            finally:
+                self._restore(saved)
+            if (solution is not None and solver.Value(order.objective) > best):
+                incumbent = solution
+                best = solver.Value(order.objective)
+                history.append((time.time() - started, best))
+        return incumbent, history
+
+if __name__ == '__main__':
+    import sys
+    from parse_orders import parse_orders
+    for order in parse_orders(sys.argv[1] if len(sys.argv) > 1 else
+                              "grader_files/orders.txt"):
+        solution, history = LNSScheduler(order).run(steps=20)
+        print("%s: objective %d" %(order.name, history[-1][1]))
+        for seconds, objective in history:
+            print("  %.3fs: %d" %(seconds, objective))
@@ -0,0 +1,243 @@
+import hashlib, threading
+from collections import OrderedDict
+from ortools.sat.python import cp_model
+import job_scheduler as js
+
+# An in-memory cache of built CP-SAT models.
+# Building the model of a large order in Python takes much longer than
+#   copying it, and the same order is often modelled again with the same
+#   constraints (e.g., by a service solving the same order repeatedly, or
+#   by edit checks that rebuild it).  Each entry holds a copy of the
+#   CpModelProto of a JobScheduler and the instance variables that refer
+#   to its variables and constraints, with each of those replaced by its
+#   index in the proto.
+# Entries are keyed by order_fingerprint, and the least recently used
+#   ones are dropped beyond max_entries.
+# The cache is not kept on disk: this ortools build can only read a
+#   CpModelProto back from text, which takes as long as building the
+#   model again, so entries only last as long as the process.
+# Pass a ModelCache to JobScheduler.create_model to use it
+
+# The instance variables that create_model sets and that are saved with
+#   the model
+model_state = ['var_keys', 'var_ids', 'start_vars', 'end_vars', 'sched_vars',
+               'interval_vars', 'var_durations', 'var_windows', 'var_values',
+               'var_costs', 'job_ids',
+               'alternative_ids', 'machine_ids', 'job_enableds',
+               'alternatives', 'task_starts', 'task_ends', 'job_starteds',
+               'identical_jobs', 'tool_events', 'tool_uses', 'part_events',
+               'cost', 'value', 'objective',
+               'machine_constraints', 'tool_constraints', 'part_constraints',
+               'cost_constraint', 'value_constraint',
+               'machine_symmetry_constraints', 'removed_jobs']
+
+def describe_task(task):
+    return (task.name, type(task).__name__,
+            tuple([tool.name for tool in task.tools]),
+            tuple([part.name for part in task.parts]),
+            (task.produced_part.name, task.quantity)
+            if isinstance(task, js.PartsTask) else None,
+            tuple([(tm.machine.name, tm.duration, tm.value)
+                   for tm in task.task_machines]))
+
+# Everything about an order that the model depends on, as nested tuples:
+#   its contents, the constraints to add and the model options.  The order
+#   of the lists is kept, since the symmetry-breaking constraints depend
+#   on it
+def describe_order(order, max_constraint):
+    return (max_constraint, order.deadline,
+            bool(order.use_costs), bool(order.use_parts),
+            tuple([(machine.name, machine.energy_cost)
+                   for machine in order.machines]),
+            tuple([(tool.name, tool.num) for tool in order.tools]),
+            tuple([(part.name, part.quantity, part.cost)
+                   for part in order.parts]),
+            tuple([describe_task(task) for task in order.tasks]),
+            tuple([(job.name, tuple([describe_task(task) for task in job.tasks]))
+                   for job in order.jobs]),
+            order.linear_ordering, order.break_job_symmetry, order.debug_names,
+            order.break_machine_symmetry, order.cumulative_tools,
+            order.release,
+            tuple(sorted(order.disabled_machines)),
+            tuple(sorted([(name, tuple(intervals)) for name, intervals
+                          in order.fixed_intervals.items()])),
+            tuple(sorted([(name, tuple(events)) for name, events
+                          in order.fixed_events.items()])))
+
+# The key of the model of an order with constraints up to max_constraint
+def order_fingerprint(order, max_constraint):
+    return hashlib.sha256(
+        repr(describe_order(order, max_constraint)).encode()).hexdigest()
+
+plain_types = set([str, int, float, bool, type(None)])
+
+def is_plain_tuple(value):
+    return (type(value) is tuple and
+            all([type(item) in plain_types for item in value]))
+
+# Whether a value is a reservoir event of tool_events or part_events:
+#   (time variable, level change, active variable)
+def is_event(value):
+    return (type(value) is tuple and len(value) == 3 and
+            type(value[0]) is cp_model.IntVar and type(value[1]) is int and
+            type(value[2]) is cp_model.IntVar)
+
+# Replace the model objects in a value of an instance variable by plain
+#   values that do not refer to the model.  Lists of variables, lists and
+#   tuples with no model objects in them (e.g., the ids in alternative_ids
+#   and the keys in var_keys), and lists of reservoir events are kept in
+#   compact forms, since a large model has many of them.  The exact type
+#   is checked first, as that is much faster than isinstance over the
+#   many values of a large model.
+# Lists are copied, as the order may edit its model while the entry is
+#   kept
+def encode_state(value):
+    kind = type(value)
+    if (kind in plain_types): return value
+    if (kind is list):
+        kinds = set([type(item) for item in value])
+        if (kinds == set([cp_model.IntVar])):
+            return ('vars', [item.Index() for item in value])
+        if (kinds == set([cp_model.IntervalVar])):
+            return ('intervals', [item.Index() for item in value])
+        if (kinds <= plain_types): return ('plain', list(value))
+        if (kinds == set([tuple])):
+            if (all([is_plain_tuple(item) for item in value])):
+                return ('plain', list(value))
+            if (all([is_event(item) for item in value])):
+                return ('events', [(time.Index(), change, active.Index())
+                                   for time, change, active in value])
+        return [encode_state(item) for item in value]
+    if (kind is tuple):
+        if (is_plain_tuple(value)): return ('plain', value)
+        return ('tuple', tuple([encode_state(item) for item in value]))
+    if (kind is dict):
+        return dict([(key, encode_state(item)) for key, item in value.items()])
+    if (kind is range): return ('range', value.start, value.stop)
+    if isinstance(value, cp_model.IntervalVar):
+        return ('interval', value.Index())
+    if isinstance(value, cp_model.IntVar): return ('var', value.Index())
+    if isinstance(value, cp_model.Constraint):
+        return ('constraint', value.Index())
+    if isinstance(value, js.TaskMachine):
+        return ('task_machine', value.task.name, value.machine.name)
+    if isinstance(value, js.Job): return ('job', value.name)
+    return value
+
+# What decode_state needs to find the objects of an order and model:
+#   dictionaries from names to the jobs and TaskMachines of the order
+#   (the first with each name, as get_named would find), and from proto
+#   indexes to the variables already decoded, so that each is made once.
+# The variables are made from the proto directly, as
+#   CpModel.GetIntVarFromProtoIndex does without its checks, since the
+#   indexes come from the model the entry was saved with
+def decode_context(order, model):
+    jobs = {}
+    for job in order.jobs: jobs.setdefault(job.name, job)
+    task_machines = {}
+    for task in order.tasks + [task for job in order.jobs for task in job.tasks]:
+        for tm in task.task_machines:
+            task_machines.setdefault((task.name, tm.machine.name), tm)
+    return {'model': model, 'proto': model.Proto(), 'job': jobs,
+            'task_machine': task_machines, 'var': {}, 'interval': {}}
+
+def decode_var(index, context):
+    var = context['var'].get(index)
+    if (var is None):
+        var = context['var'][index] = cp_model.IntVar(context['proto'], index)
+    return var
+
+def decode_interval(index, context):
+    interval = context['interval'].get(index)
+    if (interval is None):
+        interval = context['interval'][index] = \
+            cp_model.IntervalVar(context['proto'], index)
+    return interval
+
+def decode_events(value, context):
+    return [(decode_var(time, context), change, decode_var(active, context))
+            for time, change, active in value[1]]
+
+def decode_tuple(value, context):
+    return tuple([decode_state(item, context) for item in value[1]])
+
+# How to decode each kind of value that encode_state tags
+decoders = {
+    # Each order gets lists of its own, which its edits may change
+    'plain': lambda value, context: (list(value[1]) if type(value[1]) is list
+                                     else value[1]),
+    'vars': lambda value, context: [decode_var(index, context)
+                                    for index in value[1]],
+    'intervals': lambda value, context: [decode_interval(index, context)
+                                         for index in value[1]],
+    'events': decode_events,
+    'tuple': decode_tuple,
+    'var': lambda value, context: decode_var(value[1], context),
+    'interval': lambda value, context: decode_interval(value[1], context),
+    'range': lambda value, context: range(value[1], value[2]),
+    'constraint': lambda value, context: cp_model.Constraint(context['model'],
+                                                             value[1]),
+    'job': lambda value, context: context['job'][value[1]],
+    'task_machine': lambda value, context:
+        context['task_machine'][value[1], value[2]]}
+
+# The reverse of encode_state, in the context of decode_context
+def decode_state(value, context):
+    kind = type(value)
+    if (kind is dict):
+        return dict([(key, decode_state(item, context))
+                     for key, item in value.items()])
+    if (kind is list):
+        return [decode_state(item, context) for item in value]
+    if (kind is not tuple): return value
+    decoder = decoders.get(value[0])
+    if (decoder is None):
+        raise Exception("Unknown model cache value %s" %(value,))
+    return decoder(value, context)
+
+class ModelCache:
+    # max_entries: the most models to keep
+    def __init__(self, max_entries=4):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    # If the model of the order is in the cache, set the model and its
+    #   instance variables, as create_model would, and return True
+    def load(self, order, max_constraint):
+        key = order_fingerprint(order, max_constraint)
+        with self.lock:
+            entry = self.entries.get(key)
+            if (entry is None):
+                self.misses += 1
+                return False
+            self.entries.move_to_end(key)
+            self.hits += 1
+        saved, state = entry
+        model = cp_model.CpModel()
+        model.Proto().copy_from(saved.Proto())
+        model.rebuild_constant_map()
+        order.model = model
+        context = decode_context(order, model)
+        for name in model_state:
+            setattr(order, name, decode_state(state[name], context))
+        return True
+
+    # Keep a copy of the model that create_model has just built for the
+    #   order, as later edits change the model in place
+    def store(self, order, max_constraint):
+        key = order_fingerprint(order, max_constraint)
+        state = dict([(name, encode_state(getattr(order, name)))
+                      for name in model_state])
+        saved = cp_model.CpModel()
+        saved.Proto().copy_from(order.model.Proto())
+        with self.lock:
+            self.entries[key] = (saved, state)
+            self.entries.move_to_end(key)
+            while (len(self.entries) > self.max_entries):
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock: self.entries.clear()
@@ -0,0 +1,149 @@
+from concurrent.futures import ProcessPoolExecutor
+import job_scheduler as js
+
+# Options that are copied from an order to each of its components
+order_options = ['linear_ordering', 'break_job_symmetry',
+                 'break_machine_symmetry', 'cumulative_tools']
+
+# Union-find over job names
+def find(parents, name):
+    while (parents[name] != name):
+        parents[name] = parents[parents[name]]
+        name = parents[name]
+    return name
+
+def union(parents, name1, name2):
+    parents[find(parents, name1)] = find(parents, name2)
+
+# The machines, tools and parts the tasks of a job use
+def job_resources(job):
+    resources = set()
+    for task in job.tasks:
+        for tm in task.task_machines:
+            resources.add(('Machine', tm.machine.name))
+        for tool in task.tools: resources.add(('Tool', tool.name))
+        for part in task.parts: resources.add(('Part', part.name))
+        if (isinstance(task, js.PartsTask)):
+            resources.add(('Part', task.produced_part.name))
+    return resources
+
+# The resources through which a job can interact with other jobs: the
+#   machines, and the tools and parts only if the order uses them (parts
+#   are still charged for in the cost otherwise, but are not limited)
+def shared_resources(order, job):
+    return [resource for resource in job_resources(job)
+            if order.use_parts or resource[0] == 'Machine']
+
+# Split the jobs of an order into groups that share no machine, tool or
+#   part with each other.  Returns a list of lists of jobs, in the order
+#   the jobs are listed
+def order_components(order):
+    parents = {}
+    users = {}
+    for job in order.jobs:
+        parents[job.name] = job.name
+        for resource in shared_resources(order, job):
+            if (resource in users): union(parents, job.name, users[resource])
+            else: users[resource] = job.name
+    components = {}
+    for job in order.jobs:
+        components.setdefault(find(parents, job.name), []).append(job)
+    return list(components.values())
+
+# Create a JobScheduler for each independent group of jobs of the order.
+#   Each one is named after the order, with the index of the component.
+#   It starts at the release of the order, and keeps the committed work
+#   (fixed intervals and events) on its machines, tools and parts
+def split_order(order):
+    suborders = []
+    for index, jobs in enumerate(order_components(order)):
+        tasks = [task for task in order.tasks
+                 if any([task in job.tasks for job in jobs])]
+        resources = set()
+        for job in jobs: resources |= job_resources(job)
+        suborder = js.JobScheduler("%s.%d" %(order.name, index+1),
+                                   order.deadline, jobs, tasks,
+                                   [machine for machine in order.machines
+                                    if ('Machine', machine.name) in resources],
+                                   [part for part in order.parts
+                                    if ('Part', part.name) in resources],
+                                   [tool for tool in order.tools
+                                    if ('Tool', tool.name) in resources],
+                                   order.use_costs, order.use_parts)
+        for option in order_options:
+            setattr(suborder, option, getattr(order, option))
+        suborder.disabled_machines = set(order.disabled_machines)
+        suborder.release = order.release
+        suborder.fixed_intervals = dict(
+            [(name, list(intervals))
+             for name, intervals in order.fixed_intervals.items()
+             if ('Machine', name) in resources])
+        suborder.fixed_events = dict(
+            [(name, list(events))
+             for name, events in order.fixed_events.items()
+             if ('Tool', name) in resources or ('Part', name) in resources])
+        suborders.append(suborder)
+    return suborders
+
+# Build and solve the model of one component.  This runs in a worker
+#   process, so only plain values are returned: the solution, the status
+#   name and the objective, value and cost
+def solve_component(suborder, max_constraint, profile):
+    suborder.create_model(max_constraint, profile)
+    solution, solver = suborder.solve()
+    if (solution is None):
+        return None, suborder.status, 0, 0, 0
+    cost = (solver.Value(suborder.cost)
+            if suborder.cost_constraint is not None else 0)
+    return (solution, suborder.status, solver.Value(suborder.objective),
+            solver.Value(suborder.value), cost)
+
+# Merge the results of solving each component.  The schedule of the order
+#   is the union of the schedules of its components, and its objective,
+#   value and cost are their sums.  The status is OPTIMAL only if every
+#   component was solved optimally.  A component with no solution (e.g.,
+#   its time limit ran out first) schedules none of its jobs, which is
+#   always feasible; the status is then that of the component
+def merge_results(results):
+    solution = {}
+    objective = value = cost = 0
+    status = 'OPTIMAL'; unsolved = False
+    for sub_solution, sub_status, sub_objective, sub_value, sub_cost in results:
+        if (sub_solution is None):
+            if (not unsolved): status = sub_status
+            unsolved = True
+            continue
+        if (sub_status != 'OPTIMAL' and not unsolved): status = sub_status
+        solution.update(sub_solution)
+        objective += sub_objective; value += sub_value; cost += sub_cost
+    return solution, {'status': status, 'objective': objective,
+                      'value': value, 'cost': cost,
+                      'components': len(results)}
+
+# Solve an order by solving each of its independent components separately,
+#   in a pool of processes (processes=None uses one per CPU).  Returns the
+#   merged solution, in the format of JobScheduler.solve, and a dictionary
+#   with the status, objective, value and cost, and the number of
+#   components
+def solve_decomposed(order, max_constraint=6, profile=None, processes=None):
+    suborders = split_order(order)
+    if (len(suborders) == 1 or processes == 1):
+        results = [solve_component(suborder, max_constraint, profile)
+                   for suborder in suborders]
+    else:
+        with ProcessPoolExecutor(processes) as pool:
+            results = list(pool.map(solve_component, suborders,
+                                    [max_constraint]*len(suborders),
+                                    [profile]*len(suborders)))
+    return merge_results(results)
+
+if __name__ == '__main__':
+    import sys
+    from parse_orders import parse_orders
+    for order in parse_orders(sys.argv[1] if len(sys.argv) > 1 else
+                              "grader_files/orders.txt"):
+        solution, stats = solve_decomposed(order)
+        print("%s: %d components, %s, objective %s"
+              %(order.name, stats['components'], stats['status'],
+                stats['objective']))
+        print("  %s" %solution)
@@ -0,0 +1,200 @@
+import random
+from parse_orders import create_order
+
+# Random orders for scaling studies.
+# generate_order makes the description of an order: its machines, tools,
+#   parts, tasks and jobs, as plain lists and dictionaries.  The
+#   description can be written to an order file in the format read by
+#   parse_orders (write_orders), or made into a JobScheduler directly
+#   (build_order).
+# Ordinary tasks are drawn from a pool shared by the jobs, so some jobs have
+#   the same tasks, as in the grader files.  Parts are made by PartsTasks
+#   in production chains: each part in a chain is made from the one
+#   before it, and a part-making job does a whole chain in order.
+# Ranges are (lowest, highest) pairs, both included
+
+def _between(rand, bounds):
+    return rand.randint(bounds[0], bounds[1])
+
+# jobs: the number of ordinary jobs, each with tasks_per_job tasks
+# task_pool: the number of distinct ordinary tasks (by default, half the
+#   number of tasks in all the jobs)
+# machines_per_task: how many machines each task can be done on
+# tools, parts: the sizes of the tool and part pools; each ordinary task
+#   needs tools_per_task tools and parts_per_task parts
+# chain_length: the number of parts in each production chain; part_jobs
+#   of the jobs do one chain each
+# values: the value of a task, per time unit it takes, on every machine
+#   (about the energy cost of the machines, so that costs matter)
+# tightness: the deadline is the total of the shortest durations of the
+#   jobs, spread over the machines, divided by tightness.  Near 1, only
+#   some of the jobs fit; lower values leave room for more of them
+def generate_order(name='gen', jobs=20, tasks_per_job=(1, 4), task_pool=None,
+                   machines=8, machines_per_task=(1, 3), tools=4,
+                   tool_num=(2, 6), tools_per_task=(0, 2), parts=4,
+                   part_num=(5, 10), parts_per_task=(0, 2), chain_length=2,
+                   part_jobs=2, durations=(1, 5), values=(60, 150),
+                   energy=(40, 75), part_cost=(25, 150), tightness=0.8,
+                   use_costs=True, use_parts=True, seed=0, prefix=''):
+    rand = random.Random(seed)
+    machine_list = [(prefix + 'M%d' %(i+1), _between(rand, energy))
+                    for i in range(machines)]
+    tool_list = [(prefix + 'L%d' %(i+1), _between(rand, tool_num))
+                 for i in range(tools)]
+    part_list = [(prefix + 'P%d' %(i+1), _between(rand, part_num),
+                  _between(rand, part_cost)) for i in range(parts)]
+
+    def task_machines(base_value):
+        chosen = rand.sample(machine_list, min(machines,
+                                               _between(rand, machines_per_task)))
+        tms = []
+        for mname, energy_cost in chosen:
+            duration = _between(rand, durations)
+            tms.append((mname, duration, base_value * duration))
+        return tms
+
+    if (task_pool is None):
+        task_pool = max(1, jobs * sum(tasks_per_job) // 4)
+    tasks = []
+    for i in range(task_pool):
+        tasks.append({'name': prefix + 'T%d' %(i+1),
+                      'tools': [tool[0] for tool in
+                                rand.sample(tool_list, min(tools,
+                                            _between(rand, tools_per_task)))],
+                      'parts': [part[0] for part in
+                                rand.sample(part_list, min(parts,
+                                            _between(rand, parts_per_task)))],
+                      'task_machines':
+                          task_machines(_between(rand, values))})
+    job_list = [(prefix + 'J%d' %(i+1),
+                 [task['name'] for task in
+                  rand.sample(tasks, min(len(tasks),
+                                         _between(rand, tasks_per_job)))])
+                for i in range(jobs)]
+
+    # The production chains: each part is made by a PartsTask, from the
+    #   previous part of its chain
+    chains = []
+    for i, (pname, num, cost) in enumerate(part_list):
+        if (i % max(1, chain_length) == 0): chains.append([])
+        chain = chains[-1]
+        tasks.append({'name': prefix + 'T_P%d' %(i+1), 'made_part': pname,
+                      'quantity': rand.randint(1, 3), 'tools': [],
+                      'parts': [chain[-1]['made_part']] if chain else [],
+                      'task_machines': task_machines(0)})
+        chain.append(tasks[-1])
+    for i in range(part_jobs if chains else 0):
+        job_list.append((prefix + 'J_part%d' %(i+1),
+                         [task['name'] for task in rand.choice(chains)]))
+
+    # Only the tasks, tools and parts that the jobs use are kept
+    used = set([tname for jname, tnames in job_list for tname in tnames])
+    tasks = [task for task in tasks if task['name'] in used]
+    used_tools = set([tname for task in tasks for tname in task['tools']])
+    used_parts = set([pname for task in tasks
+                      for pname in task['parts'] + [task.get('made_part')]])
+    min_durations = dict([(task['name'], min([tm[1] for tm
+                                              in task['task_machines']]))
+                          for task in tasks])
+    lengths = [sum([min_durations[tname] for tname in tnames])
+               for jname, tnames in job_list]
+    deadline = max(max(lengths or [1]) + 1,
+                   int(sum(lengths) / float(machines) / tightness))
+    return {'name': name, 'deadline': deadline,
+            'machines': machine_list,
+            'tools': [tool for tool in tool_list if tool[0] in used_tools],
+            'parts': [part for part in part_list if part[0] in used_parts],
+            'tasks': tasks, 'jobs': job_list,
+            'use_costs': use_costs, 'use_parts': use_parts}
+
+# Descriptions of count orders, named <name>1, <name>2, ...  Their items
+#   are prefixed with the order name so that they can share a file
+def generate_orders(count, name='gen', seed=0, **options):
+    return [generate_order('%s%d' %(name, i+1), seed=seed+i,
+                           prefix='%s%d.' %(name, i+1), **options)
+            for i in range(count)]
+
+# Make a JobScheduler from the description of an order, with its tasks,
+#   tools and parts in the order parse_orders would list them
+def build_order(spec):
+    tasks = []
+    for task in sorted(spec['tasks'], key=lambda task: task['name']):
+        if (task.get('made_part')):
+            tasks.append((task['name'], task['made_part'], task['quantity'],
+                          task['tools'], task['parts'], task['task_machines']))
+        else:
+            tasks.append((task['name'], task['tools'], task['parts'],
+                          task['task_machines']))
+    return create_order(spec['name'], spec['deadline'], spec['machines'], tasks,
+                        spec['jobs'], sorted(spec['parts']),
+                        sorted(spec['tools']), spec['use_costs'],
+                        spec['use_parts'])
+
+def _attrs(name, attrs):
+    return "; ".join([name] + ["%s: %s" %(key, value) if value is not True
+                               else key for key, value in attrs
+                               if not (value is None or value is False or
+                                       value == '')])
+
+# The lines of an order file describing the orders
+def order_lines(specs):
+    lines = []
+    for spec in specs:
+        lines += ["Machine: " + _attrs(mname, [('energy', energy_cost)])
+                  for mname, energy_cost in spec['machines']]
+        lines += ["Tool: " + _attrs(tname, [('num', num)])
+                  for tname, num in spec['tools']]
+        lines += ["Part: " + _attrs(pname, [('num', num), ('cost', cost)])
+                  for pname, num, cost in spec['parts']]
+        for task in spec['tasks']:
+            lines.append("Task: " + _attrs(task['name'],
+                [('tools', ", ".join(task['tools'])),
+                 ('parts', ", ".join(task['parts'])),
+                 ('made-part', task.get('made_part')),
+                 ('quantity', task.get('quantity'))]))
+            lines += ["Task-Machine: " +
+                      _attrs("%s, %s" %(task['name'], mname),
+                             [('duration', duration), ('value', value)])
+                      for mname, duration, value in task['task_machines']]
+        lines += ["Job: " + _attrs(jname, [('tasks', ", ".join(tnames))])
+                  for jname, tnames in spec['jobs']]
+        lines.append("Order: " + _attrs(spec['name'],
+            [('deadline', spec['deadline']),
+             ('jobs', ", ".join([jname for jname, tnames in spec['jobs']])),
+             ('machines', ", ".join([mname for mname, energy_cost
+                                     in spec['machines']])),
+             ('use_costs', spec['use_costs']),
+             ('use_parts', spec['use_parts'])]))
+        lines.append("")
+    return lines
+
+def write_orders(filename, specs):
+    with open(filename, 'w') as f:
+        for line in order_lines(specs): f.write(line + "\n")
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Write random orders to a file')
+    parser.add_argument('filename', help='The order file to write')
+    parser.add_argument('-n', '--count', default=1, type=int,
+                        help='Number of orders')
+    parser.add_argument('--jobs', default=20, type=int,
+                        help='Number of jobs in each order')
+    parser.add_argument('--machines', default=8, type=int,
+                        help='Number of machines in each order')
+    parser.add_argument('--tools', default=4, type=int,
+                        help='Size of the tool pool')
+    parser.add_argument('--parts', default=4, type=int,
+                        help='Size of the part pool')
+    parser.add_argument('--chain-length', default=2, type=int,
+                        help='Number of parts in each production chain')
+    parser.add_argument('--tightness', default=0.8, type=float,
+                        help='How tight the deadline is (higher is tighter)')
+    parser.add_argument('--seed', default=0, type=int, help='Random seed')
+    args = parser.parse_args()
+    write_orders(args.filename,
+                 generate_orders(args.count, seed=args.seed, jobs=args.jobs,
+                                 machines=args.machines, tools=args.tools,
+                                 parts=args.parts,
+                                 chain_length=args.chain_length,
+                                 tightness=args.tightness))
@@ -0,0 +1,111 @@
+import job_scheduler as js
+import heuristic_scheduler as hs
+from order_decomposition import order_options
+
+# Rolling-horizon scheduling for orders whose deadline is too far away to
+#   model in one piece.
+# The horizon is split into overlapping windows of the given length, each
+#   starting step time units after the one before.  Each window is solved
+#   as its own, small JobScheduler containing the jobs that are not yet
+#   committed; jobs that cannot fit in the window are left out by the
+#   time-window presolve.  The jobs whose first task starts before the
+#   next window are committed, and the machine time, tools and parts they
+#   use are carried into the later windows as fixed intervals and fixed
+#   reservoir events (see JobScheduler.fixed_intervals/fixed_events).
+# A job has to fit in a single window to be scheduled, so the window
+#   should be longer than the longest job
+
+# The reservoir events of a committed task, as in
+#   JobScheduler._index_task_machine: (name, time, level change) triples
+def task_events(task, start, end):
+    events = []
+    for tool in task.tools:
+        events += [(tool.name, start, 1), (tool.name, end, -1)]
+    for part in task.parts:
+        events.append((part.name, start, 1))
+    if (isinstance(task, js.PartsTask)):
+        events.append((task.produced_part.name, end, -task.quantity))
+    return events
+
+class RollingHorizonScheduler:
+    # order: a JobScheduler
+    # window: the length of each window
+    # step: how far each window starts after the one before; the windows
+    #   overlap by window - step
+    def __init__(self, order, window, step, max_constraint=7, profile=None):
+        if (step < 1 or step > window):
+            raise Exception("Step %d must be between 1 and the window length %d"
+                            %(step, window))
+        self.order = order
+        self.window = window
+        self.step = step
+        self.max_constraint = max_constraint
+        self.profile = profile
+        self.solution = {}
+        self.fixed_intervals = {}
+        self.fixed_events = {}
+        # The status of solving each window
+        self.statuses = []
+
+    # The JobScheduler for the window starting at release, with the jobs
+    #   that are not committed yet
+    def _window_order(self, release, jobs):
+        order = self.order
+        deadline = min(order.deadline, release + self.window)
+        tasks = [task for task in order.tasks
+                 if any([task in job.tasks for job in jobs])]
+        suborder = js.JobScheduler("%s@%d" %(order.name, release), deadline,
+                                   jobs, tasks, order.machines, order.parts,
+                                   order.tools, order.use_costs,
+                                   order.use_parts)
+        for option in order_options:
+            setattr(suborder, option, getattr(order, option))
+        suborder.disabled_machines = set(order.disabled_machines)
+        suborder.release = release
+        suborder.fixed_intervals = self.fixed_intervals
+        suborder.fixed_events = self.fixed_events
+        return suborder
+
+    def _commit(self, job, entries):
+        self.solution[job.name] = entries
+        for task, mname, start, duration in \
+                self.order.match_solution_tasks(job, entries):
+            end = start + duration
+            self.fixed_intervals.setdefault(mname, []).append((start, end))
+            for name, time, change in task_events(task, start, end):
+                self.fixed_events.setdefault(name, []).append((time, change))
+
+    # Schedule the order window by window.  Returns the combined schedule,
+    #   in the format of JobScheduler.solve
+    def schedule(self):
+        order = self.order
+        remaining = list(order.jobs)
+        release = 1
+        while (remaining and release < order.deadline):
+            suborder = self._window_order(release, remaining)
+            suborder.create_model(self.max_constraint, self.profile)
+            solution, solver = suborder.solve()
+            self.statuses.append(suborder.status)
+            last = suborder.deadline >= order.deadline
+            for job in list(remaining):
+                entries = (solution or {}).get(job.name)
+                if (entries and (last or entries[0][1] < release + self.step)):
+                    self._commit(job, entries)
+                    remaining.remove(job)
+            if (last): break
+            release += self.step
+        return self.solution
+
+if __name__ == '__main__':
+    import sys
+    from parse_orders import parse_orders
+    for order in parse_orders(sys.argv[1] if len(sys.argv) > 1 else
+                              "grader_files/orders.txt"):
+        window = max(1, order.deadline // 2)
+        scheduler = RollingHorizonScheduler(order, window, max(1, window // 2))
+        solution = scheduler.schedule()
+        print("%s: objective %d (%s)"
+              %(order.name, hs.evaluate(order, solution,
+                                        order.use_costs)[0],
+                ", ".join(scheduler.statuses)))
+        print("  %s" %solution)
@@ -0,0 +1,194 @@
+import threading, time
+from collections import OrderedDict
+import job_scheduler as js
+
+# A cache of solved orders, in front of JobScheduler.solve.
+# Orders are often submitted again, unchanged or with only the names of
+#   their jobs, tasks, machines, tools and parts changed.  Each order is
+#   reduced to a canonical form in which every name is replaced by its
+#   position among the objects of its kind, sorted by what they are
+#   rather than what they are called.  Two orders with the same canonical
+#   form are the same problem, so the schedule of one, with its names
+#   mapped back, is a schedule of the other with the same objective.
+# A proven-optimal schedule (its objective reaches the bound of its solve)
+#   is returned straight from the cache, whatever the profile of the new
+#   solve; any other cached schedule, including one that is only optimal
+#   within a profile's gap, is used as a hint for a new solve.  Entries expire
+#   after ttl seconds (if given), and the least recently used ones are
+#   dropped beyond max_entries
+
+# The tasks of an order and its jobs, each once, in the order listed
+def order_tasks(order):
+    tasks = []; seen = set()
+    for task in order.tasks + [task for job in order.jobs for task in job.tasks]:
+        if (not task.name in seen):
+            seen.add(task.name)
+            tasks.append(task)
+    return tasks
+
+# Sort the objects by their signatures, keeping the listed order among
+#   equal signatures, and name them prefix0, prefix1, ...
+def canonical_names(objects, signature, prefix):
+    ranked = sorted(enumerate(objects),
+                    key=lambda item: (signature(item[1]), item[0]))
+    return dict([(obj.name, '%s%d' %(prefix, index))
+                 for index, (position, obj) in enumerate(ranked)])
+
+# Map an order to its canonical form.  Returns the form, as nested tuples
+#   that can be used as a key, and a dictionary from each kind of object
+#   ('job', 'task', 'machine', 'tool', 'part') to a dictionary from the
+#   names in the order to the canonical names
+def canonical_order(order, max_constraint):
+    tasks = order_tasks(order)
+    uses = {}
+    for task in tasks:
+        for tm in task.task_machines:
+            uses.setdefault(tm.machine.name, []).append((tm.duration, tm.value))
+    machines = canonical_names(order.machines,
+                               lambda m: (m.energy_cost,
+                                          sorted(uses.get(m.name, []))),
+                               'M')
+    tools = canonical_names(order.tools, lambda t: (t.num,), 'L')
+    parts = canonical_names(order.parts, lambda p: (p.quantity, p.cost), 'P')
+    # Tools and parts that are used but not listed in the order keep a
+    #   name of their own, so they are never matched to anything else
+    def tool(name): return tools.get(name, '?' + name)
+    def part(name): return parts.get(name, '?' + name)
+
+    def describe_task(task):
+        return (type(task).__name__,
+                tuple([tool(t.name) for t in task.tools]),
+                tuple([part(p.name) for p in task.parts]),
+                (part(task.produced_part.name), task.quantity)
+                if isinstance(task, js.PartsTask) else None,
+                tuple([(machines[tm.machine.name], tm.duration, tm.value)
+                       for tm in task.task_machines]))
+    # Tasks are known by name, so each is described once
+    descriptions = dict([(task.name, describe_task(task)) for task in tasks])
+    task_names = canonical_names(tasks,
+                                 lambda task: descriptions[task.name], 'T')
+    job_names = canonical_names(order.jobs,
+                                lambda job: [descriptions[task.name]
+                                             for task in job.tasks], 'J')
+    def describe_job(job):
+        return (job_names[job.name],
+                tuple([task_names[task.name] for task in job.tasks]))
+
+    def by_name(dictionary, names, describe):
+        return tuple(sorted([(names.get(name, '?' + name), describe(value))
+                             for name, value in dictionary.items()]))
+    form = (max_constraint, order.deadline, bool(order.use_costs),
+            bool(order.use_parts), order.release,
+            tuple(sorted([(machines[m.name], m.energy_cost)
+                          for m in order.machines])),
+            tuple(sorted([(tools[t.name], t.num) for t in order.tools])),
+            tuple(sorted([(parts[p.name], p.quantity, p.cost)
+                          for p in order.parts])),
+            tuple(sorted([(task_names[task.name], descriptions[task.name])
+                          for task in tasks])),
+            tuple(sorted([describe_job(job) for job in order.jobs])),
+            tuple(sorted([machines.get(name, '?' + name)
+                          for name in order.disabled_machines])),
+            by_name(order.fixed_intervals, machines,
+                    lambda intervals: tuple(sorted(intervals))),
+            by_name(order.fixed_events, dict(tools, **parts),
+                    lambda events: tuple(sorted(events))))
+    return form, {'job': job_names, 'task': task_names, 'machine': machines,
+                  'tool': tools, 'part': parts}
+
+# Rename the jobs and machines of a schedule, in the format of
+#   JobScheduler.solve
+def rename_solution(solution, job_names, machine_names):
+    return dict([(job_names[jname],
+                  [(machine_names[mname], start, duration)
+                   for mname, start, duration in entries])
+                 for jname, entries in solution.items()])
+
+def invert(names):
+    return dict([(value, key) for key, value in names.items()])
+
+class SolutionCache:
+    # max_entries: the most orders to keep
+    # ttl: how many seconds an entry is kept, or None to keep it until it
+    #   is evicted
+    def __init__(self, max_entries=1024, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    # Return the cached result for the order: a dictionary with its
+    #   solution (in the names of the order), status, objective, bound,
+    #   value and cost; or None
+    def lookup(self, order, max_constraint):
+        form, names = canonical_order(order, max_constraint)
+        with self.lock:
+            entry = self.entries.get(form)
+            if (entry is not None and self.ttl is not None and
+                time.monotonic() - entry[0] > self.ttl):
+                del self.entries[form]
+                entry = None
+            if (entry is None):
+                self.misses += 1
+                return None
+            self.entries.move_to_end(form)
+            self.hits += 1
+        result = dict(entry[1])
+        result['solution'] = rename_solution(result['solution'],
+                                             invert(names['job']),
+                                             invert(names['machine']))
+        return result
+
+    # Cache the result of solving the order, in the format of lookup
+    def store(self, order, max_constraint, result):
+        form, names = canonical_order(order, max_constraint)
+        result = dict(result)
+        result['solution'] = rename_solution(result['solution'],
+                                             names['job'], names['machine'])
+        with self.lock:
+            self.entries[form] = (time.monotonic(), result)
+            self.entries.move_to_end(form)
+            while (len(self.entries) > self.max_entries):
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock: self.entries.clear()
+
+    # Solve the order, with constraints up to max_constraint (by default,
+    #   those of its model, or 6 if it has none).  The model is only built
+    #   if the order is not in the cache with a proven-optimal schedule.
+    # Returns the solution, in the format of JobScheduler.solve, and a
+    #   dictionary with the status, objective, bound, value and cost, and
+    #   whether the result came from the cache
+    def solve(self, order, max_constraint=None, profile=None):
+        if (max_constraint is None):
+            max_constraint = order.max_constraint if order.model else 6
+        cached = self.lookup(order, max_constraint)
+        if (cached is not None and cached['objective'] == cached['bound']):
+            order.status = cached['status']
+            stats = dict(cached, cached=True)
+            return stats.pop('solution'), stats
+        if (order.model is None or order.max_constraint != max_constraint):
+            order.create_model(max_constraint, profile)
+        solution, solver = order.solve(
+            profile, cached['solution'] if cached else None)
+        if (solution is None):
+            return None, {'status': order.status, 'objective': None,
+                          'bound': None, 'value': None, 'cost': None,
+                          'cached': False}
+        result = {'solution': solution, 'status': order.status,
+                  'objective': solver.Value(order.objective),
+                  'bound': order.bound,
+                  'value': solver.Value(order.value),
+                  'cost': (solver.Value(order.cost)
+                           if order.cost_constraint is not None else 0)}
+        # A better schedule replaces the cached one, as does the same
+        #   objective with a tighter bound
+        if (cached is None or
+            (result['objective'], -result['bound']) >=
+            (cached['objective'], -cached['bound'])):
+            self.store(order, max_constraint, result)
+        stats = dict(result, cached=False)
+        return stats.pop('solution'), stats